@@ -16,8 +16,15 @@ import datetime
 from blind_checkers.constants import *
 from blind_checkers.rule import Rule
 from blind_checkers.board import Board
-from blind_checkers.graphics import Graphics
 from blind_checkers.game import Checkers
+from blind_checkers.arena import make_agent
+from blind_checkers.arena import arena
+from blind_checkers.league import run_league
+from blind_checkers.league import compute_points
+from blind_checkers.match import run_match_test
+from blind_checkers.rating import Ratings
+from blind_checkers.archive import run_self_play
+from blind_checkers.archive import GameArchive
 
 #from blind_checkers.agents.Random.agent import RandomAgent
 #from blind_checkers.agents.Greedy.agent import GreedyAgent
@@ -41,23 +48,6 @@ for agent_dir, _, agent_name_with_exts in os.walk(agent_root):
                     locals()[k] = getattr(module, k)
 
 
-def log_pdn(_log_dir, _pdn, _dark_name, _light_name, _round_number, _player, _done):
-    dark_result_symbol, light_result_symbol = '*', '*'
-    if _done > 0:  # game is ended.
-        if _done == 2:  # draw
-            dark_result_symbol, light_result_symbol = 'D', 'D'
-        else:
-            assert(_done == 1)  # victory
-            if _player == 1:
-                dark_result_symbol, light_result_symbol = 'W', 'L'
-            else:
-                dark_result_symbol, light_result_symbol = 'L', 'W'
-    log_name = '{}_{}({})vs{}({}).txt'.format(str(_round_number).zfill(5),
-        _dark_name, dark_result_symbol, _light_name, light_result_symbol)
-    with open(os.path.join(_log_dir, log_name), 'w') as f:
-        f.write(_pdn)
-
-
 def replay(_env, _pdn):
     _dark_name, _light_name, _round_number, _player, _matrix, _actions = _env.decode_pdn(_pdn)
 
@@ -89,47 +79,6 @@ def replay(_env, _pdn):
     return _player, _done
 
 
-def arena(_env, _agent_dark, _agent_light, _round_number=1, _log_dir='./'):
-    _player, _obs, _moves, _info = _env.reset()
-    _env.reset_pdn(_agent_dark.name, _agent_light.name, _round_number)
-    _done = 0
-
-    _env.print("Round {}".format(_round_number), font_size=72)
-    _env.print("{}\nvs\n{}".format(_agent_dark, _agent_light), font_size=56)
-    _env.print("Game Start!", font_size=72)
-
-    # Main loop.
-    while _done == 0:
-        if _player == 1:
-            current_agent = _agent_dark
-        else:
-            assert(_player == -1)
-            current_agent = _agent_light
-
-        start_time = time.time()
-        _action = current_agent.act(_obs, _moves, _info)
-        end_time = time.time()
-        if current_agent.name[:5] != 'Human' and end_time - start_time > ACTION_TIMEOUT:  # timeout, using random agent
-            timeout_agent = RandomAgent(current_agent.player, current_agent.rule)
-            _action = timeout_agent.act(_obs, _moves, _info)
-        _player, _obs, _moves, _rew, _done, _info = _env.step(_action)
-        _env.step_pdn()
-        current_agent.consume(_rew)
-
-        _env.render()
-
-        if _done > 0:  # game is ended.
-            if _done == 2:  # draw
-                _env.print("Draw", font_size=56)
-            else:
-                assert(_done == 1)
-                _env.print("{} Win".format(current_agent), font_size=56)
-
-    log_pdn(_log_dir, _env.get_pdn(), _agent_dark.name, _agent_light.name, _round_number, _player, _done)
-
-    return _player, _done
-
-
 if __name__ == '__main__':
     # Set rules.
     rule = Rule({
@@ -141,27 +90,27 @@ if __name__ == '__main__':
         'backward_capture': BACKWARD_CAPTURE
         })
 
-    # Load graphics.
-    graphics = Graphics(rule) if VISUALIZE else None
+    # Load graphics. (pygame is only imported when visualizing.)
+    graphics = None
+    if VISUALIZE:
+        from blind_checkers.graphics import Graphics
+        graphics = Graphics(rule)
 
     # agent_dark = HumanAgent(1, rule, graphics)
     # agent_light = GreedyAgent(-1, rule)
 
-    env = Checkers(rule, graphics=graphics, visualize=VISUALIZE, visualize_type=VISUALIZE_TYPE)
+    env = Checkers(rule, graphics=graphics, visualize=VISUALIZE, visualize_type=VISUALIZE_TYPE, board_type=BOARD_TYPE)
     base_log_dir = './logs/'
     log_dir = os.path.join(base_log_dir, f"{datetime.datetime.now():%Y%m%d%H%M%S}")
+    if PLAY_MODE == 'league' and LEAGUE_RESUME is not None:
+        log_dir = os.path.join(base_log_dir, LEAGUE_RESUME)
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
+    ratings = Ratings(os.path.join(base_log_dir, 'ratings.json'))  # Elo ratings of agents, across matches and leagues.
 
     if PLAY_MODE == 'match':
-        if AGENT_DARK == 'Human':
-            agent_dark = globals()[AGENT_DARK + 'Agent'](1, rule, graphics)
-        else:
-            agent_dark = globals()[AGENT_DARK + 'Agent'](1, rule)
-        if AGENT_LIGHT == 'Human':
-            agent_light = globals()[AGENT_LIGHT + 'Agent'](-1, rule, graphics)
-        else:
-            agent_light = globals()[AGENT_LIGHT + 'Agent'](-1, rule)
+        agent_dark = make_agent(AGENT_DARK, 1, rule, graphics)
+        agent_light = make_agent(AGENT_LIGHT, -1, rule, graphics)
 
         round_number, dark_win_count, light_win_count, draw_count = 0, 0, 0, 0
         while True:
@@ -181,45 +130,41 @@ if __name__ == '__main__':
                         light_win_count += 1
                 env.print("Light : Dark : Draw\n{} : {} : {}".format(light_win_count, dark_win_count, draw_count), font_size=56)
 
+        agent_dark.close()
+        agent_light.close()
         del agent_dark
         del agent_light
 
+    elif PLAY_MODE == 'test':  # pairs of games with colours swapped, until the strength difference is resolved.
+        pair_test = run_match_test(env, [AGENT_DARK, AGENT_LIGHT], rule, log_dir, ratings=ratings, graphics=graphics)
+        print(pair_test)
+        print(ratings)
+
     elif PLAY_MODE == 'league':  # implementation of league matches
-        env.visualize_type = 'no-blind'  # Force the type of visualization to observer mode.
         assert('Human' not in LEAGUE_AGENTS)  # AI league is implemented.
-        record_table = np.zeros((len(LEAGUE_AGENTS), len(LEAGUE_AGENTS)), dtype='int')
-        round_number = 0
-        for iagent_dark, AGENT_DARK in enumerate(LEAGUE_AGENTS):
-            for iagent_light, AGENT_LIGHT in enumerate(LEAGUE_AGENTS):
-                if iagent_dark == iagent_light:  # same player
-                    continue
-                agent_dark = globals()[AGENT_DARK + 'Agent'](1, rule)
-                agent_light = globals()[AGENT_LIGHT + 'Agent'](-1, rule)
-
-                round_number += 1
-                player, done = arena(env, agent_dark, agent_light, round_number, log_dir)
-
-                if done == 2:  # draw
-                    record_table[iagent_dark, iagent_light] = 2  # 2 for draw
-                else:
-                    assert(done == 1)  # victory
-                    record_table[iagent_dark, iagent_light] = player  # who wins?
-
-                del agent_dark
-                del agent_light
+        # Games are played headless on a pool of processes. (They can be watched later in replay mode.)
+        # Finished games are saved in league.json of the log directory, so an interrupted league can be resumed.
+        record_table = run_league(LEAGUE_AGENTS, rule, log_dir, checkpoint_path=os.path.join(log_dir, 'league.json'))
+        ratings.update_league(LEAGUE_AGENTS, record_table)
+        ratings.save()
+        if LEAGUE_ROUNDS == 1:
+            record_table = record_table[0]
 
         # Final points
-        points = np.zeros((len(LEAGUE_AGENTS),), dtype='int')
-        for iagent in range(len(LEAGUE_AGENTS)):
-            points[iagent] = (3 * (np.sum(record_table[iagent, :] == 1) + np.sum(record_table[:, iagent] == -1)) +  # 3 point for win
-                0 * (np.sum(record_table[iagent, :] == -1) + np.sum(record_table[:, iagent] == 1)) +  # 0 point for lose
-                1 * (np.sum(record_table[iagent, :] == 2) + np.sum(record_table[:, iagent] == 2)))  # 1 point for draw
+        points = compute_points(record_table)
         sorted_agents = [LEAGUE_AGENTS[iagent] for iagent in np.argsort(np.argsort(-points))]
 
         # This is the function for scoring the term project, so use built-in print function.
         print(record_table)
         print(points)
         print(sorted_agents)
+        print(ratings)
+
+    elif PLAY_MODE == 'self-play':  # headless games on a pool of processes, into a binary archive instead of logs.
+        assert('Human' not in SELF_PLAY_AGENTS)
+        archive_dir = os.path.join(base_log_dir, 'archive')
+        num_games = run_self_play(SELF_PLAY_AGENTS, rule, archive_dir)
+        print('{} games written, {} games in {}'.format(num_games, len(GameArchive(archive_dir)), archive_dir))
 
     elif PLAY_MODE == 'replay':  # replay mode
         pdn_path = os.path.join(base_log_dir, REPLAY_NAME)
@@ -0,0 +1,95 @@
+""" Fixed integer encoding of actions.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+from .tables import PLAYER_DIRECTIONS
+from .tables import get_tables
+
+
+class ActionSpace(object):
+    """
+    Every action (from_pos, to_pos) is encoded as an integer of from-square x direction x distance :
+    action = ((board_number - 1) * 4 + direction) * max_distance + (distance - 1),
+    where direction is an absolute direction (see tables.DIRECTIONS).
+    Actions leaving the board are never legal, so legal masks are simply of size num_actions.
+    """
+
+    def __init__(self, rule):
+        rule_tables = get_tables(rule)
+        self.size = rule.board_size
+        self.num_squares = len(rule_tables.board_number_poses) - 1
+        self.max_distance = max(2, rule.king_range + 1)  # men capture at distance 2.
+        self.num_actions = self.num_squares * 4 * self.max_distance
+
+        self.from_poses = []
+        self.to_poses = []  # None if the action leaves the board.
+        self.pos_to_square = {}
+        for square in range(self.num_squares):
+            x, y = rule_tables.board_number_poses[square + 1]
+            self.pos_to_square[(x, y)] = square
+            for direction in range(4):
+                ray = rule_tables.rays[direction][y][x]
+                for distance in range(1, self.max_distance + 1):
+                    self.from_poses.append((x, y))
+                    self.to_poses.append(ray[distance - 1] if distance <= len(ray) else None)
+        self.valid = np.array([to_pos is not None for to_pos in self.to_poses], dtype='bool')
+        self.action_indices = dict(((from_pos, to_pos), index)
+            for index, (from_pos, to_pos) in enumerate(zip(self.from_poses, self.to_poses)) if to_pos is not None)
+
+        # Order of actions in moves of Board.get_all_legal_moves, for each player.
+        self.move_orders = {}
+        for player in (1, -1):
+            order = []
+            for square in range(self.num_squares):
+                for direction in PLAYER_DIRECTIONS[player]:
+                    start = (square * 4 + direction) * self.max_distance
+                    order.extend(range(start, start + self.max_distance))
+            self.move_orders[player] = np.array(order, dtype='int')
+
+    def encode(self, action):
+        from_pos, to_pos = action
+        return self.action_indices[(tuple(from_pos), tuple(to_pos))]
+
+    def find(self, action):
+        # Same as encode, but returns None for actions which cannot be encoded.
+        try:
+            return self.encode(action)
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def decode(self, index):
+        return (self.from_poses[index], self.to_poses[index])
+
+    def moves_to_mask(self, moves):
+        mask = np.zeros((self.num_actions,), dtype='bool')
+        for from_pos, legal_moves in moves:
+            for to_pos in legal_moves:
+                mask[self.encode((from_pos, to_pos))] = True
+        return mask
+
+    def mask_to_moves(self, mask, player):
+        """
+        Inverse of moves_to_mask, in the same order as Board.get_all_legal_moves.
+        """
+
+        moves = []
+        order = self.move_orders[player]
+        for index in order[mask[order]]:
+            from_pos, to_pos = self.from_poses[index], self.to_poses[index]
+            if len(moves) > 0 and moves[-1][0] == from_pos:
+                moves[-1][1].append(to_pos)
+            else:
+                moves.append((from_pos, [to_pos]))
+        return moves
+
+
+def get_action_space(rule):
+    return get_tables(rule, ActionSpace)
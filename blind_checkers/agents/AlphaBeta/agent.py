@@ -0,0 +1,264 @@
+""" Alpha-beta search AI.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import time
+
+from ...constants import *
+from ...game import Checkers
+from ...clock import allocate_time
+from ...transposition import TranspositionTable
+from ...transposition import EXACT, LOWER, UPPER
+from ..agent import Agent
+
+
+WIN_SCORE = 100000  # score of a victory, minus the number of plies to reach it.
+MAN_SCORE = 100
+KING_SCORE = 300
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AlphaBetaAgent(Agent):
+    """
+    Iterative deepening alpha-beta (principal variation search) on the board, with BLIND squares taken as empty.
+    Exact for the 'no-blind' rule (sight covering the board), and usable on any determinized position.
+    Moves are ordered by the transposition table move, captures, killer moves and the history heuristic.
+    A ply is a single hop, and hops continuing a capture neither change sides nor use depth.
+    At depth 0, quiescence search continues while captures are available.
+    """
+
+    def __init__(self, player, rule, time_budget=None, max_depth=64, board_type=BOARD_TYPE,
+            table_size=TRANSPOSITION_TABLE_SIZE):
+        base_name = 'AlphaBeta'
+        max_time = ACTION_TIMEOUT - SEARCH_TIME_MARGIN
+        self.time_budget = max_time if time_budget is None else min(time_budget, max_time)
+        self.max_depth = max_depth
+        self.env = Checkers(rule, board_type=board_type, obs_type='lazy', collect_prev_obs=False)
+        self.action_space = self.env.action_space
+        self.table = TranspositionTable(table_size)
+        self.history = np.zeros((self.action_space.num_actions,), dtype='int')
+        self.killers = {}  # ply : two most recent quiet moves which caused a cutoff.
+        self.deadline = None
+        self.num_nodes = 0
+        self.stats = {}
+        super(AlphaBetaAgent, self).__init__(base_name, player, rule)
+
+    def evaluate(self):
+        # Material, seen from the player to move.
+        own = self.env.player * self.env.board.matrix
+        return int(MAN_SCORE * (np.sum(own == DARK) - np.sum(own == -DARK)) +
+            KING_SCORE * (np.sum(own == DARK_KING) - np.sum(own == -DARK_KING)))
+
+    def check_time(self):
+        self.num_nodes += 1
+        if self.num_nodes % 256 == 0 and time.time() >= self.deadline:
+            raise SearchTimeout()
+
+    def order_moves(self, moves, ply, table_move):
+        env = self.env
+        captures = set()
+        if not env.hop and not self.rule.force_capture and env.board.capture_available(env.player):
+            for from_pos, legal_moves in env.board.get_all_legal_moves(env.player, True):
+                captures.update((from_pos, to_pos) for to_pos in legal_moves)
+        killers = self.killers.get(ply, ())
+        scored = []
+        for from_pos, legal_moves in moves:
+            for to_pos in legal_moves:
+                action = (from_pos, to_pos)
+                index = self.action_space.encode(action)
+                if index == table_move:
+                    score = 1 << 40
+                elif action in captures:
+                    score = 1 << 39
+                elif index in killers:
+                    score = (1 << 38) - killers.index(index)
+                else:
+                    score = int(self.history[index])
+                scored.append((-score, len(scored), index, action))
+        scored.sort()
+        return [(index, action) for _, _, index, action in scored]
+
+    def child_value(self, action, depth, alpha, beta, ply, quiescence):
+        env = self.env
+        mover = env.player
+        _, _, _, done = env.push(action)
+        if done == 1:
+            value = WIN_SCORE - ply if env.player == mover else -(WIN_SCORE - ply)
+        elif done == 2:
+            value = 0
+        elif quiescence:
+            if env.player == mover:  # the capture continues.
+                value = self.quiescence(alpha, beta, ply + 1)
+            else:
+                value = -self.quiescence(-beta, -alpha, ply + 1)
+        else:
+            if env.player == mover:
+                value = self.search(depth, alpha, beta, ply + 1)
+            else:
+                value = -self.search(depth - 1, -beta, -alpha, ply + 1)
+        env.pop()
+        return value
+
+    def quiescence(self, alpha, beta, ply):
+        self.check_time()
+        env = self.env
+        if env.hop:
+            moves = env.moves
+        elif env.board.capture_available(env.player):
+            if self.rule.force_capture:
+                moves = env.moves
+            else:
+                stand_pat = self.evaluate()
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+                moves = env.board.get_all_legal_moves(env.player, True)
+        else:
+            return self.evaluate()
+        best_value = -WIN_SCORE if self.rule.force_capture or env.hop else alpha
+        for from_pos, legal_moves in moves:
+            for to_pos in legal_moves:
+                value = self.child_value((from_pos, to_pos), 0, alpha, beta, ply, True)
+                if value > best_value:
+                    best_value = value
+                if value > alpha:
+                    alpha = value
+                if alpha >= beta:
+                    return best_value
+        return best_value
+
+    def search(self, depth, alpha, beta, ply):
+        if depth <= 0:
+            return self.quiescence(alpha, beta, ply)
+        self.check_time()
+        env = self.env
+        alpha_orig = alpha
+        key = env.get_key()
+        table_move = -1
+        entry = self.table.probe(key)
+        if entry is not None:
+            value, entry_depth, flag, table_move = entry
+            value = int(value)
+            if abs(value) > WIN_SCORE // 2:  # victory scores are stored relative to the node.
+                value -= ply if value > 0 else -ply
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return value
+                elif flag == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        best_value, best_index = -WIN_SCORE - 1, -1
+        for imove, (index, action) in enumerate(self.order_moves(env.moves, ply, table_move)):
+            if imove == 0:
+                value = self.child_value(action, depth, alpha, beta, ply, False)
+            else:  # null window first, and search again only when it fails high.
+                value = self.child_value(action, depth, alpha, alpha + 1, ply, False)
+                if alpha < value < beta:
+                    value = self.child_value(action, depth, alpha, beta, ply, False)
+            if value > best_value:
+                best_value, best_index = value, index
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                if not self.is_capture(action):
+                    killers = self.killers.setdefault(ply, [])
+                    if index not in killers:
+                        killers.insert(0, index)
+                        del killers[2:]
+                    self.history[index] += depth * depth
+                break
+
+        if best_value <= alpha_orig:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        stored_value = best_value
+        if abs(stored_value) > WIN_SCORE // 2:
+            stored_value += ply if stored_value > 0 else -ply
+        self.table.store(key, stored_value, depth, flag, best_index)
+        return best_value
+
+    def is_capture(self, action):
+        # Quiet moves never pass over a piece.
+        (from_x, from_y), (to_x, to_y) = action
+        matrix = self.env.board.matrix
+        step_x, step_y = int(to_x > from_x) * 2 - 1, int(to_y > from_y) * 2 - 1
+        for distance in range(1, abs(to_x - from_x)):
+            if matrix[from_y + step_y * distance, from_x + step_x * distance] != EMPTY:
+                return True
+        return False
+
+    def act(self, obs, moves, info):
+        start_time = time.time()
+        self.deadline = start_time + allocate_time(info, self.time_budget)
+        self.num_nodes = 0
+        root_actions = [(from_pos, to_pos) for from_pos, legal_moves in moves for to_pos in legal_moves]
+        if len(root_actions) == 1:
+            self.stats = {'depth': 0, 'nodes': 0, 'nodes-per-sec': 0., 'depth-per-sec': 0.,
+                'time': time.time() - start_time}
+            return root_actions[0]
+
+        env = self.env
+        matrix = np.array(obs, dtype='int8')
+        matrix[matrix == BLIND] = EMPTY
+        env.reset(self.player, matrix)
+        env.move_count = info['move-count']
+        root_moves = [(from_pos, list(legal_moves)) for from_pos, legal_moves in moves]
+        self.table.new_search()
+        self.killers = {}
+        self.history //= 2
+
+        best_action, best_value, depth_done = root_actions[0], 0, 0
+        try:
+            for depth in range(1, self.max_depth + 1):
+                alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+                num_nodes = self.num_nodes
+                iteration_action, iteration_value = None, None
+                ordered = self.order_moves(root_moves, 0, self.action_space.encode(best_action))
+                for imove, (index, action) in enumerate(ordered):
+                    if imove == 0:
+                        value = self.child_value(action, depth, alpha, beta, 0, False)
+                    else:
+                        value = self.child_value(action, depth, alpha, alpha + 1, 0, False)
+                        if alpha < value < beta:
+                            value = self.child_value(action, depth, alpha, beta, 0, False)
+                    if iteration_value is None or value > iteration_value:
+                        iteration_action, iteration_value = action, value
+                    alpha = max(alpha, value)
+                best_action, best_value, depth_done = iteration_action, iteration_value, depth
+                self.report_action(best_action)
+                if WIN_SCORE - abs(best_value) <= depth:  # the game is decided within the searched depth.
+                    break
+                if self.num_nodes == num_nodes:  # every root action ends the game, deeper passes are the same.
+                    break
+        except SearchTimeout:
+            while len(env.undo_stack) > 0:
+                env.pop()
+
+        elapsed_time = time.time() - start_time
+        self.stats = {'depth': depth_done, 'nodes': self.num_nodes, 'value': best_value,
+            'nodes-per-sec': self.num_nodes / max(elapsed_time, 1e-9),
+            'depth-per-sec': depth_done / max(elapsed_time, 1e-9), 'time': elapsed_time}
+        return best_action
+
+    def consume(self, rew):
+        pass
+
+    def get_stats(self):
+        return self.stats
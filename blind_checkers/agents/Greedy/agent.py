@@ -19,50 +19,61 @@ from ..Random.agent import RandomAgent
 
 
 class GreedyAgent(Agent):
-    def __init__(self, player, rule, future_count=4, num_simulation=5):
+    REWARD_WEIGHTS = (('capture-man', 1.), ('capture-king', 5.), ('promotion', 3.), ('win', 100.),
+        ('draw', 0.))  # no point for draw
+
+    def __init__(self, player, rule, future_count=4, num_simulation=5, board_type=BOARD_TYPE, pool=None):
         base_name = 'Greedy'
         self.future_count = future_count
         self.num_simulation = num_simulation
+        self.board_type = board_type
+        self.pool = pool  # RolloutPool of parallel.py, to run the simulations in worker processes.
         self.sub_agent = RandomAgent(1, rule) # no player specified.
+        # Scratch environment of all simulations, reset once in each act and rolled back by pop().
+        self.env = Checkers(rule, board_type=board_type, obs_type='lazy', collect_prev_obs=False)
         super(GreedyAgent, self).__init__(base_name, player, rule)
 
     def compute_reward(self, last_player, rew):
         r = 0.
-        r += float(rew['capture-man']) * 1.
-        r += float(rew['capture-king']) * 5.
-        r += float(rew['promotion']) * 3.
-        r += float(rew['win']) * 100.
-        r += float(rew['draw']) * 0.  # no point for draw
+        for name, weight in self.REWARD_WEIGHTS:
+            r += float(rew[name]) * weight
         if self.player != last_player:  # negative reward
             r = -r
         return r
 
     def act(self, obs, moves, info):
+        matrix = np.array(obs, dtype='int8')
+        matrix[matrix == BLIND] = EMPTY
+        if self.pool is not None:
+            actions = [(from_pos, to_pos) for from_pos, legal_moves in moves for to_pos in legal_moves]
+            scores = self.pool.evaluate(matrix, self.player, info['move-count'], actions,
+                self.num_simulation, self.future_count, self.REWARD_WEIGHTS)
+            return self.choose(actions, scores)
+        temp_env = self.env
+        temp_env.reset(self.player, matrix)
+        temp_env.move_count = info['move-count']
         scores = []
         actions = []
         for from_pos, legal_moves in moves:
             for to_pos in legal_moves:
                 score = 0.
                 for _ in range(self.num_simulation):
-                    matrix = np.copy(obs)
-                    matrix[matrix == BLIND] = EMPTY
-                    temp_env = Checkers(self.rule)
-                    temp_env.reset(self.player, matrix)
-                    temp_env.move_count = info['move-count']
                     action = (from_pos, to_pos)
                     for _ in range(self.future_count):
                         last_player = temp_env.player
-                        _, temp_obs, temp_moves, temp_rew, temp_done, temp_info = temp_env.step(action)
+                        _, temp_moves, temp_rew, temp_done = temp_env.push(action)
                         score += self.compute_reward(last_player, temp_rew)
                         if temp_done > 0:
                             break
-                        action = self.sub_agent.act(temp_obs, temp_moves, temp_info)
-                    del temp_env
-                    del matrix
+                        action = self.sub_agent.act(None, temp_moves, None)  # random agent only uses moves.
+                    while len(temp_env.undo_stack) > 0:
+                        temp_env.pop()
                 score /= self.num_simulation
                 scores.append(score)
                 actions.append((from_pos, to_pos))
-        scores = np.array(scores)
+        return self.choose(actions, np.array(scores))
+
+    def choose(self, actions, scores):
         max_indices = np.where(scores == np.max(scores))[0]
         random_index = int(np.random.random_sample() * len(max_indices))
         max_index = max_indices[random_index]
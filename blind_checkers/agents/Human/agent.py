@@ -11,9 +11,6 @@ import numpy as np
 
 import time
 
-import pygame
-import pygame.locals
-
 from ...constants import *
 from ...board import Board
 from ...game import Checkers
@@ -50,6 +47,8 @@ class HumanAgent(Agent):
         (like a mouse click) and then effect the game state.
         """
 
+        import pygame  # imported here, so that importing agents does not need pygame.
+        import pygame.locals
         for event in pygame.event.get():
             if event.type == pygame.locals.QUIT:
                 self.graphics.close_window()
@@ -0,0 +1,353 @@
+""" Information set Monte Carlo tree search AI.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import time
+import math
+
+from ...constants import *
+from ...game import Checkers
+from ...clock import allocate_time
+from ...belief import BeliefState
+from ..agent import Agent
+
+
+class Node(object):
+    """
+    Node of the information set tree, shared by every determinization.
+    Children are keyed by the action (from_pos, to_pos) which leads to them,
+    and count in how many determinizations they were available.
+    Nodes do not refer to their parents, so that a discarded branch is freed as soon as it is dropped.
+    """
+
+    __slots__ = ('action', 'mover', 'children', 'visits', 'value', 'availability', 'size')
+
+    def __init__(self, action=None, mover=0):
+        self.action = action
+        self.mover = mover  # player who played the action.
+        self.children = {}
+        self.visits = 0
+        self.value = 0.  # sum of results, seen from the mover.
+        self.availability = 0
+        self.size = 1  # number of nodes in the subtree.
+
+    def ucb(self, exploration):
+        return self.value / self.visits + exploration * math.sqrt(math.log(self.availability) / self.visits)
+
+
+class ISMCTSAgent(Agent):
+    """
+    Single observer ISMCTS : each iteration samples a determinization of the blind squares,
+    and walks the shared tree only through actions which are legal in it.
+    The search stops at the time budget (always inside ACTION_TIMEOUT and the clock) or at max_nodes new nodes.
+
+    With reuse_tree, the subtree of the realised continuation is kept for the next move :
+    the own action, then the information set of the turn of the opponent. Subtrees of every opponent action
+    consistent with the own views (hidden hops included) are merged, and the tree is dropped only if none is.
+    The tree never grows over max_tree_nodes nodes, and iterations beyond it are simulated without expansion.
+    ponder searches the same subtree during the turn of the opponent.
+    With num_particles, determinizations are drawn from a BeliefState tracking the moves of the opponent,
+    instead of hidden pieces placed uniformly on blind squares.
+    """
+
+    def __init__(self, player, rule, time_budget=None, max_nodes=None, exploration=0.7, rollout_depth=20,
+            board_type=BOARD_TYPE, num_particles=None, reuse_tree=True, max_tree_nodes=MAX_TREE_NODES, seed=None):
+        base_name = 'ISMCTS'
+        max_time = ACTION_TIMEOUT - SEARCH_TIME_MARGIN
+        self.time_budget = max_time if time_budget is None else min(time_budget, max_time)
+        self.max_nodes = max_nodes
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.reuse_tree = reuse_tree
+        self.max_tree_nodes = max_tree_nodes
+        self.random_state = np.random.RandomState(seed)
+        self.env = Checkers(rule, board_type=board_type, obs_type='lazy', collect_prev_obs=False)
+
+        # Opponent pieces left, counted from the captures of this agent.
+        self.num_initial_pieces = ((rule.board_size - 1) // 2) * (rule.board_size // 2)
+        self.num_opponent_pieces = self.num_initial_pieces
+        self.belief = None
+        if num_particles is not None:
+            self.belief = BeliefState(rule, player, num_particles, seed=self.random_state.randint(1 << 31))
+        self.root = None  # tree of the last search, rooted after the own action.
+        self.pending_action = None  # own action which is not applied yet to the belief and the tree.
+        self.determinization = None  # prepared determinization and move count of the last observation.
+        self.move_count = 0
+        self.num_pondered = 0
+        self.stats = {}
+        super(ISMCTSAgent, self).__init__(base_name, player, rule)
+
+    def prepare_determinization(self, obs):
+        matrix = np.array(obs, dtype='int8')
+        ys, xs = np.where(np.bitwise_and(matrix == BLIND, (np.arange(self.rule.board_size)[:, None] +
+            np.arange(self.rule.board_size)[None, :]) % 2 == 1))
+        num_visible = np.sum(np.bitwise_or(-self.player * matrix == DARK, -self.player * matrix == DARK_KING))
+        num_hidden = min(max(self.num_opponent_pieces - num_visible, 0), len(ys))
+        matrix[matrix == BLIND] = EMPTY
+        return matrix, ys, xs, num_hidden
+
+    def determinize(self, matrix, ys, xs, num_hidden):
+        """
+        Sample a full board : hidden opponent pieces are placed on random blind squares.
+        """
+
+        matrix = np.copy(matrix)
+        if num_hidden > 0:
+            indices = self.random_state.choice(len(ys), num_hidden, replace=False)
+            hidden_ys, hidden_xs = ys[indices], xs[indices]
+            promotion_y = self.rule.board_size - 1 if self.player == -1 else 0  # last row of the opponent.
+            matrix[hidden_ys, hidden_xs] = np.where(hidden_ys == promotion_y, -self.player * DARK_KING,
+                -self.player * DARK)
+        return matrix
+
+    def evaluate(self, matrix):
+        # Result for the agent when the rollout is cut, from the material.
+        own = self.player * matrix
+        diff = (np.sum(own == DARK) - np.sum(own == -DARK) +
+            3 * (np.sum(own == DARK_KING) - np.sum(own == -DARK_KING)))
+        return 0.5 + 0.5 * math.tanh(diff / 4.)
+
+    def random_action(self, moves):
+        from_pos, legal_moves = moves[int(self.random_state.random_sample() * len(moves))]
+        return (from_pos, legal_moves[int(self.random_state.random_sample() * len(legal_moves))])
+
+    def is_consistent(self, action, before, after):
+        """
+        Whether a hop of the opponent can be this action, from the own views before and after it :
+        the squares of the action hold what it needs where they are seen (they may be blind),
+        own pieces which it jumps over die (or are removed), and no other square seen in both views changes.
+        """
+
+        (from_x, from_y), (to_x, to_y) = action
+        opponent = -self.player
+        if before[from_y, from_x] != BLIND and opponent * before[from_y, from_x] not in (DARK, DARK_KING):
+            return False
+        if after[from_y, from_x] not in (BLIND, EMPTY) or before[to_y, to_x] not in (BLIND, EMPTY):
+            return False
+        if after[to_y, to_x] != BLIND and opponent * after[to_y, to_x] not in (DARK, DARK_KING):
+            return False
+        changed = (before != BLIND) & (after != BLIND) & (before != after) & (np.abs(before) != DARK_DEAD)
+        changed[from_y, from_x], changed[to_y, to_x] = False, False
+        step_x, step_y = int(to_x > from_x) * 2 - 1, int(to_y > from_y) * 2 - 1
+        for distance in range(1, abs(to_x - from_x)):
+            x, y = from_x + step_x * distance, from_y + step_y * distance
+            if before[y, x] != BLIND and after[y, x] != BLIND and self.player * before[y, x] in (DARK, DARK_KING):
+                if after[y, x] != EMPTY and self.player * after[y, x] != DARK_DEAD:  # removed at the end of the turn.
+                    return False
+                changed[y, x] = False
+        return not np.any(changed)
+
+    def merge(self, node, other):
+        # Adds the statistics and the subtree of other (of the same mover) to node. Returns node.
+        node.visits += other.visits
+        node.value += other.value
+        node.availability += other.availability
+        for action, other_child in other.children.items():
+            child = node.children.get(action)
+            if child is None:
+                node.children[action] = other_child
+                node.size += other_child.size
+            else:
+                size = child.size
+                self.merge(child, other_child)
+                node.size += child.size - size
+        return node
+
+    def follow_opponent(self, node, prev_obs, obs):
+        """
+        Node of the information set reached by the turn of the opponent : after each hop, children of every
+        consistent action are merged, from the most visited one. Children whose turn ends before the last hop,
+        or goes on after it, are left out. None if no child is consistent.
+        """
+
+        views = [np.asarray(view) for view in prev_obs] + [np.asarray(obs)]
+        for ihop, (before, after) in enumerate(zip(views[:-1], views[1:])):
+            next_mover = self.player if ihop == len(views) - 2 else -self.player
+            candidates = [child for action, child in node.children.items() if self.is_consistent(action, before, after)
+                and all(grandchild.mover == next_mover for grandchild in child.children.values())]
+            if len(candidates) == 0:
+                return None
+            candidates.sort(key=lambda child: -child.visits)
+            node = candidates[0]
+            for child in candidates[1:]:
+                self.merge(node, child)
+        return node
+
+    def find_root(self, obs, info):
+        self.flush_action()
+        node, self.root = self.root, None
+        if node is None or not self.reuse_tree:
+            return None
+        if len(info['prev-obs']) > 0:
+            node = self.follow_opponent(node, info['prev-obs'], obs)
+        elif any(child.mover != self.player for child in node.children.values()):
+            node = None  # the opponent has moved without observations.
+        return node
+
+    def flush_action(self):
+        action, self.pending_action = self.pending_action, None
+        if action is None:
+            return
+        if self.belief is not None:
+            self.belief.apply_action(action)
+        if self.root is not None:
+            self.root = self.root.children.get(action)
+
+    def iterate(self, root, root_actions):
+        """
+        One iteration from the root, on a new determinization of the last observation.
+        """
+
+        env = self.env
+        if self.belief is not None:
+            env.reset(self.player, self.belief.sample()[0])
+        else:
+            env.reset(self.player, self.determinize(*self.determinization))
+        env.move_count = self.move_count
+        node = root
+        path = [root]
+        actions = root_actions
+        winner, done = 0, 0
+        expanded = 0
+
+        # Selection and expansion.
+        while True:
+            untried = []
+            best, best_ucb = None, -np.inf
+            for action in actions:
+                child = node.children.get(action)
+                if child is None:
+                    untried.append(action)
+                else:
+                    child.availability += 1
+                    if len(untried) == 0:
+                        ucb = child.ucb(self.exploration)
+                        if ucb > best_ucb:
+                            best, best_ucb = child, ucb
+            mover = env.player
+            if len(untried) > 0:
+                action = untried[int(self.random_state.random_sample() * len(untried))]
+                if root.size < self.max_tree_nodes:
+                    child = Node(action, mover)
+                    child.availability = 1
+                    node.children[action] = child
+                    expanded = 1
+                else:  # memory cap : simulated without expansion.
+                    child = None
+            else:
+                action, child = best.action, best
+            winner, next_moves, _, done = env.push(action)
+            if child is not None:
+                node = child
+                path.append(node)
+            if done > 0 or len(untried) > 0:
+                break
+            actions = [(from_pos, to_pos) for from_pos, legal_moves in next_moves for to_pos in legal_moves]
+
+        # Simulation.
+        for _ in range(self.rollout_depth):
+            if done > 0:
+                break
+            winner, next_moves, _, done = env.push(self.random_action(next_moves))
+        if done == 1:
+            result = 1. if winner == self.player else 0.
+        elif done == 2:
+            result = 0.5
+        else:
+            result = self.evaluate(env.board.matrix)
+
+        # Backpropagation.
+        for node in path:
+            node.visits += 1
+            node.value += result if node.mover == self.player else 1. - result
+            node.size += expanded
+        path[-1].size -= expanded  # the new node counts itself from the start.
+
+    def act(self, obs, moves, info):
+        start_time = time.time()
+        deadline = start_time + allocate_time(info, self.time_budget)
+        if info.get('turn-count', -1) == 0:  # new game
+            self.num_opponent_pieces = self.num_initial_pieces
+            self.root, self.pending_action = None, None
+            if self.belief is not None:
+                self.belief.reset()
+        root = self.find_root(obs, info)
+        if self.belief is not None:
+            self.belief.update(obs, info['prev-obs'], moves)
+        self.determinization = self.prepare_determinization(obs)
+        self.move_count = info['move-count']
+        root_actions = [(from_pos, to_pos) for from_pos, legal_moves in moves for to_pos in legal_moves]
+        if root is None:
+            root = Node(mover=-self.player)
+        num_reused = root.size - 1
+        num_pondered, self.num_pondered = self.num_pondered, 0
+        if len(root_actions) == 1:
+            self.stats = {'iterations': 0, 'ponder-iterations': num_pondered, 'nodes': root.size,
+                'reused-nodes': num_reused, 'nodes-per-sec': 0., 'time': time.time() - start_time}
+            return self.choose(root, root_actions[0])
+
+        num_iterations = 0
+        while time.time() < deadline and (self.max_nodes is None or root.size - 1 - num_reused < self.max_nodes):
+            num_iterations += 1
+            self.iterate(root, root_actions)
+            if self.action_reporter is not None and num_iterations % 64 == 0:
+                best = self.get_best_child(root, root_actions)
+                if best is not None:
+                    self.report_action(best.action)
+
+        elapsed_time = time.time() - start_time
+        self.stats = {'iterations': num_iterations, 'ponder-iterations': num_pondered, 'nodes': root.size,
+            'reused-nodes': num_reused, 'nodes-per-sec': (root.size - 1 - num_reused) / max(elapsed_time, 1e-9),
+            'time': elapsed_time}
+        best = self.get_best_child(root, root_actions)
+        if best is None:  # no time even for one iteration.
+            return self.choose(root, root_actions[int(self.random_state.random_sample() * len(root_actions))])
+        return self.choose(root, best.action)
+
+    def get_best_child(self, root, root_actions):
+        # A reused root also has children of other determinizations, whose actions may be illegal here.
+        children = [root.children[action] for action in root_actions if action in root.children]
+        return max(children, key=lambda child: child.visits) if len(children) > 0 else None
+
+    def ponder(self, stop_event):
+        """
+        Grows the subtree of the own last action during the turn of the opponent,
+        on determinizations of the last observation. It is kept by the tree reuse of the next act.
+        """
+
+        action = self.pending_action
+        if self.root is None or action is None:
+            return
+        while not stop_event.is_set() and self.root.size < self.max_tree_nodes:
+            self.iterate(self.root, [action])
+            self.num_pondered += 1
+
+    def choose(self, root, action):
+        # The belief and the tree follow the action at the next act, or the realised one given to observe.
+        self.root = root if self.reuse_tree else None
+        self.pending_action = action
+        return action
+
+    def observe(self, transition):
+        if transition['done'] > 0:
+            self.root, self.pending_action = None, None
+        elif transition['player'] == self.player and transition['action'] is not None:
+            action = transition['action']
+            if np.isscalar(action):
+                action = self.env.action_space.decode(action)
+            from_pos, to_pos = action
+            self.pending_action = (tuple(from_pos), tuple(to_pos))
+
+    def consume(self, rew):
+        if rew['capture-man'] or rew['capture-king']:
+            self.num_opponent_pieces -= 1
+
+    def get_stats(self):
+        return self.stats
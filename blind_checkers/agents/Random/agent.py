@@ -23,6 +23,9 @@ class RandomAgent(Agent):
         super(RandomAgent, self).__init__(base_name, player, rule)
 
     def act(self, obs, moves, info):
+        if isinstance(moves, np.ndarray):  # legal mask of integer actions.
+            legal_actions = np.flatnonzero(moves)
+            return int(legal_actions[int(np.random.random_sample() * len(legal_actions))])
         random_index1 = int(np.random.random_sample() * len(moves))
         from_pos, legal_moves = moves[random_index1]
         assert(len(legal_moves) > 0)
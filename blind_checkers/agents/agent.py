@@ -24,6 +24,7 @@ class Agent(ABC):
         self.name = name
         self.player = player
         self.rule = rule
+        self.action_reporter = None  # set by hosts which stop the agent at a deadline (see isolation.py).
 
     @abstractmethod
     def act(self, obs, moves, info):
@@ -33,5 +34,37 @@ class Agent(ABC):
     def consume(self, rew):
         pass
 
+    def observe(self, transition):
+        """
+        Called for both agents after every step, with the realised transition :
+        {'player': player who moved, 'action': applied action (None for the other agent, as it is hidden),
+        'next-player': player to move, 'done': done}.
+        The applied action differs from the returned one when it was replaced (for example at timeout).
+        """
+
+        pass
+
+    def ponder(self, stop_event):
+        """
+        Called on a background thread of the worker process of an IsolatedAgent during the turn of the opponent,
+        when the arena ponders.
+        Should return soon after stop_event (threading.Event) is set, and keep its results for the next act.
+        """
+
+        pass
+
+    def report_action(self, action):
+        # Best action found so far during act, which a host can play if act does not return in time.
+        if self.action_reporter is not None:
+            self.action_reporter(action)
+
+    def get_stats(self):
+        # Statistics of the last act (for example search speed), empty for agents without search.
+        return {}
+
+    def close(self):
+        # Releases resources of the agent, such as worker processes.
+        pass
+
     def __str__(self):
         return self.name
@@ -0,0 +1,204 @@
+""" Agents hosted in worker processes, with hard deadlines.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import time
+import threading
+import traceback
+import multiprocessing
+
+from ..constants import *
+from ..actions import get_action_space
+from .agent import Agent
+from .Random.agent import RandomAgent
+
+
+def encode_action(action_space, action):
+    # Integer action, or None if the action can not be encoded.
+    if np.isscalar(action):
+        return int(action)
+    return action_space.find(action)
+
+
+def run_worker(conn, agent_class, player, rule, agent_kwargs):
+    """
+    Main loop of a worker process : requests are tuples (command, ...),
+    and act replies with 'best' messages for reported actions, then one 'action' or 'error' message.
+    """
+
+    agent = agent_class(player, rule, **agent_kwargs)
+    action_space = get_action_space(rule)
+    conn.send(('ready', 0, agent.name))
+    ponder_event, ponder_thread = None, None
+    while True:
+        message = conn.recv()
+        if ponder_thread is not None:  # every request stops pondering.
+            ponder_event.set()
+            ponder_thread.join()
+            ponder_event, ponder_thread = None, None
+
+        command = message[0]
+        if command == 'act':
+            _, request, obs, packed_mask, index_moves, info = message
+            mask = np.unpackbits(packed_mask, count=action_space.num_actions).astype('bool')
+            moves = mask if index_moves else action_space.mask_to_moves(mask, player)
+            info = dict(info)
+            info['prev-obs'] = list(info['prev-obs'])
+            agent.action_reporter = lambda action: conn.send(('best', request, encode_action(action_space, action)))
+            try:
+                action = agent.act(obs, moves, info)
+                conn.send(('action', request, encode_action(action_space, action), agent.get_stats()))
+            except Exception:
+                conn.send(('error', request, traceback.format_exc()))
+            agent.action_reporter = None
+        elif command == 'consume':
+            agent.consume(message[1])
+        elif command == 'observe':
+            agent.observe(message[1])
+        elif command == 'ponder':
+            ponder_event = threading.Event()
+            ponder_thread = threading.Thread(target=agent.ponder, args=(ponder_event,), daemon=True)
+            ponder_thread.start()
+        elif command == 'close':
+            break
+        else:
+            raise ValueError('Invalid command: %s.' % command)
+    conn.close()
+
+
+class IsolatedAgent(Agent):
+    """
+    Proxy of an agent which runs in a persistent worker process, behind a pipe.
+    Observations, legal moves (as a packed legal mask) and info are sent as compact arrays.
+    act always returns before the deadline : with the action of the agent, the last action it reported
+    with report_action, or a random action. A worker which misses the deadline or crashes is restarted,
+    with a new instance of the agent.
+    """
+
+    def __init__(self, agent_class, player, rule, deadline=None, **agent_kwargs):
+        self.agent_class = agent_class
+        self.agent_kwargs = agent_kwargs
+        self.deadline = ACTION_TIMEOUT - AGENT_DEADLINE_MARGIN if deadline is None else deadline
+        self.action_space = get_action_space(rule)
+        self.fallback_agent = RandomAgent(player, rule)
+        self.process = None
+        self.conn = None
+        self.num_requests = 0
+        self.num_timeouts = 0
+        self.num_errors = 0
+        self.num_restarts = 0
+        self.stats = {}
+        super(IsolatedAgent, self).__init__('Isolated', player, rule)
+        self.start()
+        _, _, self.name = self.conn.recv()  # name of the hosted agent.
+
+    def start(self):
+        self.conn, worker_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=run_worker,
+            args=(worker_conn, self.agent_class, self.player, self.rule, self.agent_kwargs), daemon=True)
+        self.process.start()
+        worker_conn.close()
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(('close',))
+        except (EOFError, OSError):
+            pass
+        self.process.join(0.1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process, self.conn = None, None
+
+    def restart(self):
+        self.num_restarts += 1
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.start()
+
+    def send(self, message):
+        # Requests without replies. A dead worker is restarted at the next act.
+        try:
+            self.conn.send(message)
+        except (EOFError, OSError):
+            pass
+
+    def act(self, obs, moves, info):
+        deadline = time.time() + self.deadline
+        if info.get('time-limit') is not None:  # clock of the arena.
+            if info['time-limit'] <= AGENT_DEADLINE_MARGIN:  # no time for the worker, which is left as it is.
+                return self.fallback_agent.act(obs, moves, info)
+            deadline = min(deadline, time.time() + info['time-limit'] - AGENT_DEADLINE_MARGIN)
+        index_moves = isinstance(moves, np.ndarray)
+        mask = moves if index_moves else self.action_space.moves_to_mask(moves)
+        info = dict(info)
+        info['prev-obs'] = np.array([np.asarray(prev_obs, dtype='int8') for prev_obs in info['prev-obs']],
+            dtype='int8').reshape((-1, self.rule.board_size, self.rule.board_size))
+
+        self.num_requests += 1
+        request = self.num_requests
+        action = None
+        try:
+            if not self.process.is_alive():
+                self.restart()
+            self.conn.send(('act', request, np.asarray(obs, dtype='int8'), np.packbits(mask), index_moves, info))
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0. or not self.conn.poll(remaining):  # hung or too slow.
+                    self.num_timeouts += 1
+                    self.restart()
+                    break
+                message = self.conn.recv()
+                if message[1] != request:
+                    continue
+                if message[0] in ('best', 'action') and message[2] is not None:
+                    if not isinstance(message[2], (int, np.integer)) or not 0 <= message[2] < len(mask):
+                        self.num_errors += 1
+                        print('Invalid action index: %s.' % (message[2],), file=sys.stderr)
+                        action = None
+                        break
+                    if mask[message[2]]:
+                        action = message[2]
+                if message[0] == 'action':
+                    self.stats = message[3]
+                    break
+                elif message[0] == 'error':
+                    self.num_errors += 1
+                    print(message[2], file=sys.stderr)
+                    break
+        except (EOFError, OSError):  # crashed.
+            self.num_errors += 1
+            self.restart()
+
+        if action is None:
+            return self.fallback_agent.act(obs, moves, info)
+        return action if index_moves else self.action_space.decode(action)
+
+    def consume(self, rew):
+        self.send(('consume', rew))
+
+    def observe(self, transition):
+        self.send(('observe', transition))
+
+    def ponder(self, stop_event):
+        # The worker ponders on its own, until the next request.
+        self.send(('ponder',))
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats.update({'timeouts': self.num_timeouts, 'errors': self.num_errors, 'restarts': self.num_restarts})
+        return stats
+
+    def close(self):
+        self.stop()
@@ -0,0 +1,297 @@
+""" Binary archive of games, played by a self-play farm.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import io
+import json
+import glob
+import traceback
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+
+from .constants import *
+from .rule import Rule
+from .tables import get_tables
+from .game import Checkers
+from .arena import make_agent
+from .arena import arena
+from .pdn import PDN_RESULTS
+from .pdn import read_pdn_games
+from .pdn import decode_pdn_turns
+from .pdn import PDNWriter
+
+
+# Record of a game in the index of a shard. Hops of the game are moves[offset:offset + num_hops] of the shard.
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('num_hops', '<u4'), ('dark', '<u2'), ('light', '<u2'),
+    ('winner', 'i1'), ('done', 'i1'), ('seed', '<u4')])
+
+
+def get_shard_paths(archive_dir, shard_id):
+    # Hops as (from board number, to board number) uint8 pairs, and index records.
+    shard_path = os.path.join(archive_dir, 'shard_%05d' % shard_id)
+    return shard_path + '.moves', shard_path + '.index'
+
+
+def get_shard_ids(archive_dir):
+    return sorted(int(os.path.basename(index_path)[6:-6])
+        for index_path in glob.glob(os.path.join(archive_dir, 'shard_*.index')))
+
+
+def load_meta(archive_dir):
+    # Rule of the archive and agent names, whose positions are the agent ids of the index.
+    with open(os.path.join(archive_dir, 'meta.json'), 'r') as f:
+        return json.load(f)
+
+
+def save_meta(archive_dir, meta):
+    meta_path = os.path.join(archive_dir, 'meta.json')
+    temp_path = '%s.%d.tmp' % (meta_path, os.getpid())
+    with open(temp_path, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(temp_path, meta_path)
+
+
+def add_agents(archive_dir, rule, agent_names):
+    # Creates the archive if needed, and gives ids to new agent names. Returns the meta of the archive.
+    if not os.path.exists(archive_dir):
+        os.makedirs(archive_dir)
+    if os.path.exists(os.path.join(archive_dir, 'meta.json')):
+        meta = load_meta(archive_dir)
+        if meta['rule'] != json.loads(json.dumps(rule.to_dict())):
+            raise ValueError('Invalid archive rule: %s.' % meta['rule'])
+    else:
+        meta = {'rule': rule.to_dict(), 'agents': []}
+    for agent_name in agent_names:
+        if agent_name not in meta['agents']:
+            meta['agents'].append(agent_name)
+    save_meta(archive_dir, meta)
+    return meta
+
+
+def get_next_shard_id(archive_dir):
+    # Shards of earlier runs are never written again.
+    return max(get_shard_ids(archive_dir) + [-1]) + 1
+
+
+class ShardWriter(object):
+    """
+    Appends games to one shard of an archive. Only one writer may write each shard.
+    Games are kept in memory and written every flush_games games : hops first, then index records,
+    so that an index record never points past the hops on disk, even if the process is killed.
+    """
+
+    def __init__(self, archive_dir, shard_id, flush_games=ARCHIVE_FLUSH_GAMES):
+        moves_path, index_path = get_shard_paths(archive_dir, shard_id)
+        self.moves_file = open(moves_path, 'ab')
+        self.index_file = open(index_path, 'ab')
+        self.offset = os.path.getsize(moves_path) // 2  # hops already in the shard.
+        self.flush_games = flush_games
+        self.num_games = 0  # games appended by this writer.
+        self.hops = []
+        self.records = []
+
+    def append(self, hops, dark_id, light_id, winner, done, seed):
+        self.records.append((self.offset, len(hops), dark_id, light_id, winner, done, seed))
+        self.num_games += 1
+        self.hops.extend(hops)
+        self.offset += len(hops)
+        if len(self.records) >= self.flush_games:
+            self.flush()
+
+    def flush(self):
+        if len(self.records) == 0:
+            return
+        self.moves_file.write(np.array(self.hops, dtype='uint8').reshape((-1, 2)).tobytes())
+        self.moves_file.flush()
+        self.index_file.write(np.array(self.records, dtype=INDEX_DTYPE).tobytes())
+        self.index_file.flush()
+        self.hops, self.records = [], []
+
+    def close(self):
+        self.flush()
+        self.moves_file.close()
+        self.index_file.close()
+
+
+class GameArchive(object):
+    """
+    Reader of an archive, with random access to every game through memory maps of the shards.
+    archive[i] is a dict of agent names, winner (1 or -1, 0 if not finished), done (2 for draw), seed,
+    and hops as an (num_hops, 2) array of board numbers. get_actions(i) gives (from_pos, to_pos) actions
+    to replay the game with Checkers.step.
+    """
+
+    def __init__(self, archive_dir):
+        meta = load_meta(archive_dir)
+        self.rule = Rule(meta['rule'])
+        self.agent_names = meta['agents']
+        self.indices, self.moves = [], []
+        for shard_id in get_shard_ids(archive_dir):
+            moves_path, index_path = get_shard_paths(archive_dir, shard_id)
+            num_games = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+            num_hops = os.path.getsize(moves_path) // 2
+            self.indices.append(np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(num_games,))
+                if num_games > 0 else np.zeros((0,), dtype=INDEX_DTYPE))
+            self.moves.append(np.memmap(moves_path, dtype='uint8', mode='r', shape=(num_hops, 2))
+                if num_hops > 0 else np.zeros((0, 2), dtype='uint8'))
+        self.ends = np.cumsum([len(index) for index in self.indices], dtype='int')  # games up to each shard.
+
+    def __len__(self):
+        return int(self.ends[-1]) if len(self.ends) > 0 else 0
+
+    def get_record(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError('Invalid game number: %d.' % i)
+        ishard = int(np.searchsorted(self.ends, i, side='right'))
+        record = self.indices[ishard][i - (self.ends[ishard - 1] if ishard > 0 else 0)]
+        return ishard, record
+
+    def __getitem__(self, i):
+        ishard, record = self.get_record(i)
+        offset, num_hops = int(record['offset']), int(record['num_hops'])
+        return {'dark': self.agent_names[record['dark']], 'light': self.agent_names[record['light']],
+            'winner': int(record['winner']), 'done': int(record['done']), 'seed': int(record['seed']),
+            'hops': np.array(self.moves[ishard][offset:offset + num_hops])}
+
+    def get_actions(self, i):
+        board_number_poses = get_tables(self.rule).board_number_poses
+        return [(board_number_poses[from_number], board_number_poses[to_number])
+            for from_number, to_number in self[i]['hops']]
+
+    def get_records(self):
+        # Index records of every game, for fast scans of results.
+        return np.concatenate(self.indices) if len(self.indices) > 0 else np.zeros((0,), dtype=INDEX_DTYPE)
+
+
+def play_self_play_shard(task):
+    """
+    Plays the games of one shard in a worker process, with one agent of each name on each side for all games.
+    games are (dark id, light id, seed). A game which fails is reported and ends the shard, keeping the games
+    before it. Returns the number of games written.
+    """
+
+    shard_id, games, agent_names, rule, board_type, archive_dir = task
+    env = Checkers(rule, board_type=board_type)
+    agents = {}
+    writer = ShardWriter(archive_dir, shard_id)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # messages of the headless environment.
+            for dark_id, light_id, seed in games:
+                for agent_id, player in ((dark_id, 1), (light_id, -1)):
+                    if (agent_id, player) not in agents:
+                        agents[(agent_id, player)] = make_agent(agent_names[agent_id], player, rule)
+                np.random.seed(seed)
+                hops = []
+                player, done = arena(env, agents[(dark_id, 1)], agents[(light_id, -1)], _log_dir=None, _record=hops)
+                writer.append(hops, dark_id, light_id, player if done == 1 else 0, done, seed)
+    except Exception:
+        print(traceback.format_exc(), file=sys.stderr)
+    finally:
+        writer.close()
+        for agent in agents.values():
+            agent.close()
+    return writer.num_games
+
+
+def run_self_play(agent_names, rule, archive_dir, num_games=SELF_PLAY_GAMES, num_workers=SELF_PLAY_WORKERS,
+        shard_games=ARCHIVE_SHARD_GAMES, board_type=BOARD_TYPE, seed=None):
+    """
+    Plays num_games headless games on num_workers processes, and appends them to the archive in archive_dir
+    as new shards of shard_games games. Games go through every pair of different agents on both sides
+    (a single agent plays itself). Returns the number of games written. A shard which fails is reported.
+    """
+
+    meta = add_agents(archive_dir, rule, agent_names)
+    agent_ids = [meta['agents'].index(agent_name) for agent_name in agent_names]
+    pairs = [(dark_id, light_id) for dark_id in agent_ids for light_id in agent_ids if dark_id != light_id]
+    pairs = pairs if len(pairs) > 0 else [(agent_ids[0], agent_ids[0])]
+    seeds = np.random.SeedSequence(seed).generate_state(num_games)
+    games = [pairs[igame % len(pairs)] + (int(seeds[igame]),) for igame in range(num_games)]
+
+    first_shard_id = get_next_shard_id(archive_dir)
+    num_workers = num_workers if num_workers is not None else os.cpu_count()
+    num_written = 0
+    with ProcessPoolExecutor(num_workers) as executor:
+        futures = []
+        for ishard, start in enumerate(range(0, num_games, shard_games)):
+            task = (first_shard_id + ishard, games[start:start + shard_games], meta['agents'], rule, board_type,
+                archive_dir)
+            futures.append(executor.submit(play_self_play_shard, task))
+        for future in as_completed(futures):
+            try:
+                num_written += future.result()
+            except Exception:
+                print(traceback.format_exc(), file=sys.stderr)
+    return num_written
+
+
+def export_pdn(archive_dir, pdn_path, board_type=BOARD_TYPE):
+    """
+    Appends every game of the archive to one PDN file, in one pass. Returns the number of games written.
+    """
+
+    archive = GameArchive(archive_dir)
+    env = Checkers(archive.rule, board_type=board_type)
+    with PDNWriter(pdn_path) as writer:
+        for igame in range(len(archive)):
+            game = archive[igame]
+            env.reset()
+            env.reset_pdn(game['dark'], game['light'], igame + 1)
+            for action in archive.get_actions(igame):
+                env.step(action)
+                env.step_pdn()
+            env.add_pdn_tag('Seed', game['seed'])
+            writer.write(env.get_pdn())
+        return writer.num_games
+
+
+def import_pdn(pdn_path, archive_dir, rule, board_type=BOARD_TYPE, shard_games=ARCHIVE_SHARD_GAMES):
+    """
+    Appends the games of a PDN file to the archive as new shards, reading the file as a stream.
+    Agents are the White (light) and Black (dark) tags. Games with a FEN setup (the archive keeps only games
+    from the initial board) or with illegal moves under rule are skipped.
+    Returns the numbers of imported and skipped games.
+    """
+
+    meta = add_agents(archive_dir, rule, [])
+    env = Checkers(rule, board_type=board_type, collect_prev_obs=False)
+    shard_id = get_next_shard_id(archive_dir)
+    writer, num_imported, num_skipped = None, 0, 0
+    for game in read_pdn_games(pdn_path):
+        if 'FEN' in game['tags']:
+            num_skipped += 1
+            continue
+        try:
+            paths = decode_pdn_turns(env, game)
+        except ValueError:
+            num_skipped += 1
+            continue
+        agent_ids = []
+        for tag in ('Black', 'White'):
+            agent_name = game['tags'].get(tag, '')
+            if agent_name not in meta['agents']:
+                meta = add_agents(archive_dir, rule, [agent_name])
+            agent_ids.append(meta['agents'].index(agent_name))
+        if writer is None or num_imported % shard_games == 0:
+            if writer is not None:
+                writer.close()
+                shard_id += 1
+            writer = ShardWriter(archive_dir, shard_id)
+        hops = []
+        for path in paths:
+            board_numbers = [env.board.pos_to_board_number(pos) for pos in path]
+            hops.extend(zip(board_numbers[:-1], board_numbers[1:]))
+        winner, done = PDN_RESULTS.get(game['result'], (0, 0))
+        writer.append(hops, agent_ids[0], agent_ids[1], winner, done, 0)
+        num_imported += 1
+    if writer is not None:
+        writer.close()
+    return num_imported, num_skipped
@@ -0,0 +1,138 @@
+""" Games between two agents.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import time
+import importlib
+
+from .constants import *
+from .clock import TimeControl
+from .agents.isolation import IsolatedAgent
+from .agents.Random.agent import RandomAgent
+
+
+_AGENT_CLASSES = {}  # agent name : agent class.
+
+
+def get_agent_class(agent_name):
+    """
+    Class of the agent name (for example 'Greedy' for GreedyAgent), from the agent modules in agents.
+    """
+
+    if agent_name not in _AGENT_CLASSES:
+        class_name = agent_name + 'Agent'
+        agent_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agents')
+        for agent_dir, _, file_names in sorted(os.walk(agent_root)):
+            if agent_dir == agent_root or 'agent.py' not in file_names:
+                continue
+            module_name = '.'.join(os.path.relpath(agent_dir, agent_root).split(os.sep))
+            module = importlib.import_module('.agents.%s.agent' % module_name, __package__)
+            if hasattr(module, class_name):
+                _AGENT_CLASSES[agent_name] = getattr(module, class_name)
+                break
+        else:
+            raise ValueError('Invalid agent name: %s.' % agent_name)
+    return _AGENT_CLASSES[agent_name]
+
+
+def make_agent(_agent_name, _player, _rule, _graphics=None):
+    agent_class = get_agent_class(_agent_name)
+    if _agent_name == 'Human':
+        return agent_class(_player, _rule, _graphics)
+    elif ISOLATE_AGENTS or PONDER:  # hosted in a worker process, which is stopped at the deadline (and ponders there).
+        return IsolatedAgent(agent_class, _player, _rule)
+    else:
+        return agent_class(_player, _rule)
+
+
+def get_log_name(_dark_name, _light_name, _round_number, _player, _done):
+    dark_result_symbol, light_result_symbol = '*', '*'
+    if _done > 0:  # game is ended.
+        if _done == 2:  # draw
+            dark_result_symbol, light_result_symbol = 'D', 'D'
+        else:
+            assert(_done == 1)  # victory
+            if _player == 1:
+                dark_result_symbol, light_result_symbol = 'W', 'L'
+            else:
+                dark_result_symbol, light_result_symbol = 'L', 'W'
+    return '{}_{}({})vs{}({}).txt'.format(str(_round_number).zfill(5),
+        _dark_name, dark_result_symbol, _light_name, light_result_symbol)
+
+
+def log_pdn(_log_dir, _pdn, _dark_name, _light_name, _round_number, _player, _done):
+    log_name = get_log_name(_dark_name, _light_name, _round_number, _player, _done)
+    with open(os.path.join(_log_dir, log_name), 'w') as f:
+        f.write(_pdn)
+
+
+def arena(_env, _agent_dark, _agent_light, _round_number=1, _log_dir='./', _ponder=PONDER, _time_control=None,
+        _record=None):
+    # _log_dir=None writes no PDN log. _record is a list which gets (from board number, to board number) of each hop.
+    _player, _obs, _moves, _info = _env.reset()
+    _env.reset_pdn(_agent_dark.name, _agent_light.name, _round_number)
+    _done = 0
+    _clock = TimeControl() if _time_control is None else _time_control
+    _clock.reset()
+
+    _env.print("Round {}".format(_round_number), font_size=72)
+    _env.print("{}\nvs\n{}".format(_agent_dark, _agent_light), font_size=56)
+    _env.print("Game Start!", font_size=72)
+
+    # Main loop.
+    while _done == 0:
+        if _player == 1:
+            current_agent = _agent_dark
+        else:
+            assert(_player == -1)
+            current_agent = _agent_light
+
+        # The other agent ponders in its worker process until its next request.
+        # Agents in this process never ponder, since they would take the interpreter from the acting agent.
+        waiting_agent = _agent_light if current_agent is _agent_dark else _agent_dark
+        if _ponder and isinstance(waiting_agent, IsolatedAgent):
+            waiting_agent.ponder(None)
+
+        time_limit = _clock.get_limit(_player)
+        _info.update(_clock.get_info(_player))
+        start_time, start_cpu_time = time.time(), time.process_time()
+        if current_agent.name[:5] == 'Human' or time_limit > 0.:
+            _action = current_agent.act(_obs, _moves, _info)
+        end_time, end_cpu_time = time.time(), time.process_time()
+        if current_agent.name[:5] != 'Human' and (time_limit <= 0. or end_time - start_time > time_limit):
+            # timeout (or no time left on the clock), using random agent
+            timeout_agent = RandomAgent(current_agent.player, current_agent.rule)
+            _action = timeout_agent.act(_obs, _moves, _info)
+        _player, _obs, _moves, _rew, _done, _info = _env.step(_action)
+        _env.step_pdn()
+        if _record is not None:
+            _record.append((_env.board.pos_to_board_number(_env.from_pos), _env.board.pos_to_board_number(_env.to_pos)))
+        _clock.charge(current_agent.player, end_time - start_time, end_cpu_time - start_cpu_time,
+            _done > 0 or _player != current_agent.player)
+        current_agent.consume(_rew)
+        for agent in (_agent_dark, _agent_light):
+            agent.observe({'player': current_agent.player, 'action': _action if agent is current_agent else None,
+                'next-player': _player, 'done': _done})
+
+        _env.render()
+
+        if _done > 0:  # game is ended.
+            if _done == 2:  # draw
+                _env.print("Draw", font_size=56)
+            else:
+                assert(_done == 1)
+                _env.print("{} Win".format(current_agent), font_size=56)
+
+    if _log_dir is not None:
+        for name, value in _clock.get_pdn_tags():
+            _env.add_pdn_tag(name, value)
+        log_pdn(_log_dir, _env.get_pdn(), _agent_dark.name, _agent_light.name, _round_number, _player, _done)
+
+    return _player, _done
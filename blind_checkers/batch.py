@@ -0,0 +1,312 @@
+""" Environment stepping many games at once.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+from .tables import DIRECTIONS
+from .tables import get_tables
+from .board import Board
+from .actions import get_action_space
+
+
+WALL = 5  # encoding of the outside of the board, used for padding.
+
+
+def shift(array, dx, dy):
+    """
+    Moves the content of (N, size, size) array by (dx, dy). Squares coming from outside are zero.
+    """
+
+    size = array.shape[-1]
+    shifted = np.zeros_like(array)
+    if abs(dx) >= size or abs(dy) >= size:
+        return shifted
+    shifted[:, max(dy, 0):size+min(dy, 0), max(dx, 0):size+min(dx, 0)] = \
+        array[:, max(-dy, 0):size+min(-dy, 0), max(-dx, 0):size+min(-dx, 0)]
+    return shifted
+
+
+def dilate(array, sight):
+    # Square window of radius sight around each true square, done separately along y and x.
+    sight = min(sight, array.shape[-1] - 1)
+    dilated = array.copy()
+    for s in range(1, sight + 1):
+        dilated |= shift(array, 0, s) | shift(array, 0, -s)
+    result = dilated.copy()
+    for s in range(1, sight + 1):
+        result |= shift(dilated, s, 0) | shift(dilated, -s, 0)
+    return result
+
+
+class BatchTables(object):
+    """
+    Flat indices of every action for one rule, with the index board_size**2 for squares outside the board.
+    """
+
+    def __init__(self, rule):
+        rule_tables = get_tables(rule)
+        action_space = get_action_space(rule)
+        size = rule.board_size
+        self.outside = size * size
+        self.num_squares = action_space.num_squares
+        self.max_distance = action_space.max_distance
+        self.num_actions = action_space.num_actions
+
+        self.from_index = np.array([y * size + x for x, y in rule_tables.board_number_poses[1:]], dtype='int')
+        # ray_index[d, k-1, square] : k-th square along direction d.
+        self.ray_index = np.full((4, self.max_distance, self.num_squares), self.outside, dtype='int')
+        for d in range(4):
+            for square, (x, y) in enumerate(rule_tables.board_number_poses[1:]):
+                for k, (next_x, next_y) in enumerate(rule_tables.rays[d][y][x][:self.max_distance]):
+                    self.ray_index[d, k, square] = next_y * size + next_x
+        self.forward = np.array([dy for _, dy in DIRECTIONS], dtype='int')  # forward for player if dy * player > 0.
+
+        # Actions are ordered as (square, direction, distance), see ActionSpace.
+        self.action_from = np.repeat(self.from_index, 4 * self.max_distance)
+        self.action_to = np.transpose(self.ray_index, (2, 0, 1)).reshape(-1)
+        self.action_paths = np.full((self.num_actions, max(self.max_distance - 1, 1)), self.outside, dtype='int')
+        distances = np.tile(np.arange(1, self.max_distance + 1), self.num_squares * 4)
+        for k in range(1, self.max_distance):
+            has_path = distances > k
+            rays = np.transpose(self.ray_index[:, k - 1, :], (1, 0))  # (square, direction)
+            self.action_paths[has_path, k - 1] = np.repeat(rays.reshape(-1), self.max_distance)[has_path]
+
+
+class BatchCheckers(object):
+    """
+    Steps num_games games of checkers at once. Boards are kept in one (num_games, size, size) int8 array,
+    and every part of the step (moves, captures, dead pieces, promotion, draw count, legal moves and
+    fog of war) is done with array operations over all games.
+    Actions are integers of ActionSpace, and legal moves are given as boolean masks over them.
+    Finished games are left as they are (their actions are ignored) until they are reset.
+    Unlike Checkers, the previous observations during opponent's turn are not collected.
+    """
+
+    def __init__(self, rule, num_games, draw_move_count=DRAW_MOVE_COUNT):
+        self.rule = rule
+        self.num_games = num_games
+        self.draw_move_count = draw_move_count
+        self.tables = get_tables(rule, BatchTables)
+        self.action_space = get_action_space(rule)
+        self.init_matrix = Board(rule).matrix.astype('int8')
+
+        size = rule.board_size
+        self.boards = np.zeros((num_games, size, size), dtype='int8')
+        self.players = -np.ones((num_games,), dtype='int8')
+        self.selected = -np.ones((num_games,), dtype='int')  # flat index of the piece in the middle of capturing
+        self.hops = np.zeros((num_games,), dtype='bool')
+        self.capture_man = np.zeros((num_games,), dtype='bool')
+        self.capture_king = np.zeros((num_games,), dtype='bool')
+        self.promotion = np.zeros((num_games,), dtype='bool')
+        self.turn_counts = np.zeros((num_games,), dtype='int')
+        self.move_counts = np.zeros((num_games,), dtype='int')
+        self.dones = np.zeros((num_games,), dtype='int8')
+        self.masks = np.zeros((num_games, self.tables.num_actions), dtype='bool')
+
+    def reset(self, indices=None, players=-1, matrices=None):
+        """
+        Reset the given games (all games by default).
+        Returns players, observations, legal masks and info of all games.
+        """
+
+        if indices is None:
+            indices = np.arange(self.num_games)
+        indices = np.asarray(indices, dtype='int')
+        if matrices is None:
+            self.boards[indices] = self.init_matrix
+        else:
+            self.boards[indices] = matrices
+        self.players[indices] = players
+        self.selected[indices] = -1
+        self.hops[indices] = False
+        self.capture_man[indices] = False
+        self.capture_king[indices] = False
+        self.promotion[indices] = False
+        self.turn_counts[indices] = 0
+        self.move_counts[indices] = 0
+        self.dones[indices] = 0
+        self.masks[indices] = self.legal_masks(indices)
+
+        info = {'move-count': self.move_counts.copy()}
+        return self.players.copy(), self.blind_boards(self.players), self.masks.copy(), info
+
+    def legal_masks(self, indices):
+        """
+        Legal masks of the given games, for their current players, selected pieces and hops.
+        """
+
+        tables = self.tables
+        num = len(indices)
+        flat = self.boards[indices].reshape((num, self.tables.outside))
+        padded = np.concatenate([flat, np.full((num, 1), WALL, dtype='int8')], axis=1)
+        players = self.players[indices][:, None]
+        pieces = padded[:, tables.from_index] * players  # own pieces are positive.
+        own_man = pieces == DARK
+        own_king = pieces == DARK_KING
+        king_range = self.rule.king_range
+        max_distance = tables.max_distance if np.any(own_king) else 2  # men only need two squares.
+
+        # Built as (direction, distance, game, square) so that every write is contiguous.
+        quiet = np.zeros((4, tables.max_distance, num, tables.num_squares), dtype='bool')
+        capture = np.zeros((4, tables.max_distance, num, tables.num_squares), dtype='bool')
+        for d in range(4):
+            forward = (tables.forward[d] * players) > 0
+            man_capture = own_man & (forward | self.rule.backward_capture)
+            opponent_count = np.zeros(pieces.shape, dtype='int8')
+            block = np.zeros(pieces.shape, dtype='bool')
+            for k in range(1, max_distance + 1):
+                target = padded[:, tables.ray_index[d, k - 1]] * players
+                empty = target == EMPTY
+                clear = empty & ~block
+                if k == 1:
+                    quiet[d, 0] |= own_man & forward & empty
+                if k <= king_range:
+                    quiet[d, k - 1] |= own_king & clear & (opponent_count == 0)
+                capturing = clear & (opponent_count == 1)
+                if k == 2:
+                    capture[d, 1] |= man_capture & capturing
+                if k <= king_range + 1:
+                    capture[d, k - 1] |= own_king & capturing
+                opponent = (target == LIGHT) | (target == LIGHT_KING)  # relative to the player
+                opponent_count += opponent
+                block |= (target != EMPTY) & ~opponent
+
+        hops = self.hops[indices]
+        if self.rule.force_capture:
+            hops = hops | np.any(capture, axis=(0, 1, 3))
+        masks = capture | (quiet & ~hops[:, None])
+        selected = self.selected[indices]
+        masks &= (selected[:, None] < 0) | (tables.from_index[None, :] == selected[:, None])
+        return np.transpose(masks, (2, 3, 0, 1)).reshape((num, tables.num_actions))
+
+    def blind_boards(self, players):
+        """
+        Observations of all games, each for the given player.
+        """
+
+        relative = self.boards * players.astype('int8')[:, None, None]
+        own_men = relative == DARK
+        own_kings = relative == DARK_KING
+        any_king = np.any(own_kings)
+        visible = dilate(own_men, self.rule.sight)
+        if any_king:
+            visible |= dilate(own_kings, self.rule.king_sight)
+
+        if self.rule.sight == 1:  # additional process to capture
+            opponent = relative < 0  # including dead opponents
+            for d, (dx, dy) in enumerate(DIRECTIONS):
+                allowed = ((dy * players) > 0) | self.rule.backward_capture
+                capturing = own_men & shift(opponent, -dx, -dy) & allowed[:, None, None]
+                visible |= shift(capturing, 2 * dx, 2 * dy)
+
+        if any_king:
+            opponent = (relative == LIGHT) | (relative == LIGHT_KING)
+            blockers = (relative > 0) | (np.abs(relative) == DARK_DEAD)
+            king_range = self.rule.king_range
+            for d, (dx, dy) in enumerate(DIRECTIONS):
+                opponent_count = np.zeros(relative.shape, dtype='int8')
+                block = np.zeros(relative.shape, dtype='bool')
+                for k in range(1, king_range + 1):
+                    visible |= shift(own_kings, k * dx, k * dy)
+                    opponent_count += shift(opponent, -k * dx, -k * dy)
+                    block |= shift(blockers, -k * dx, -k * dy)
+                capturing = own_kings & (opponent_count == 1) & ~block
+                visible |= shift(capturing, (king_range + 1) * dx, (king_range + 1) * dy)
+
+        obs = self.boards.copy()
+        obs[~visible] = BLIND
+        return obs
+
+    def end_turn(self, indices, to_index):
+        flat = self.boards.reshape((self.num_games, -1))
+        boards = flat[indices]
+        boards[np.abs(boards) == DARK_DEAD] = EMPTY
+        flat[indices] = boards
+
+        size = self.rule.board_size
+        pieces = flat[indices, to_index]
+        promotion = (((pieces == DARK) & (to_index // size == size - 1)) |
+            ((pieces == LIGHT) & (to_index // size == 0)))
+        flat[indices[promotion], to_index[promotion]] *= 2
+        self.promotion[indices] = promotion
+
+        self.players[indices] *= -1
+        self.turn_counts[indices] += self.players[indices] == -1
+        captured = self.capture_man[indices] | self.capture_king[indices]  # No reset for promotion.
+        self.move_counts[indices] = np.where(captured, 0, self.move_counts[indices] + 1)
+        self.selected[indices] = -1
+        self.hops[indices] = False
+
+    def step(self, actions):
+        """
+        Step all unfinished games by one action each.
+        Returns players, observations, legal masks, rewards, dones and info, stacked over all games.
+        """
+
+        tables = self.tables
+        actions = np.asarray(actions, dtype='int')
+        active = np.flatnonzero(self.dones == 0)
+        actions = actions[active]
+        if not np.all(self.masks[active, actions]):
+            raise ValueError('Invalid action.')
+
+        flat = self.boards.reshape((self.num_games, -1))
+        from_index = tables.action_from[actions]
+        to_index = tables.action_to[actions]
+        flat[active, to_index] = flat[active, from_index]
+        flat[active, from_index] = EMPTY
+
+        capture_man = np.zeros((len(active),), dtype='bool')
+        capture_king = np.zeros((len(active),), dtype='bool')
+        for k in range(tables.action_paths.shape[1]):
+            path = tables.action_paths[actions, k]
+            inside = np.flatnonzero(path != tables.outside)
+            pieces = flat[active[inside], path[inside]]
+            captured = pieces != EMPTY
+            flat[active[inside][captured], path[inside][captured]] = np.sign(pieces[captured]) * DARK_DEAD
+            capture_man[inside] |= np.abs(pieces) == DARK
+            capture_king[inside] |= np.abs(pieces) == DARK_KING
+        capture_king &= ~capture_man
+        self.capture_man[active] = capture_man
+        self.capture_king[active] = capture_king
+
+        # The turn goes on while the piece can capture more.
+        hop = capture_man | capture_king
+        going_on = np.zeros((len(active),), dtype='bool')
+        if np.any(hop):
+            hop_indices = active[hop]
+            self.selected[hop_indices] = to_index[hop]
+            self.hops[hop_indices] = True
+            masks = self.legal_masks(hop_indices)
+            going_on[hop] = np.any(masks, axis=1)
+            self.masks[hop_indices[going_on[hop]]] = masks[going_on[hop]]
+        ended = active[~going_on]
+        self.end_turn(ended, to_index[~going_on])
+        self.masks[ended] = self.legal_masks(ended)
+
+        dones = np.where(self.move_counts[active] == self.draw_move_count, 2,
+            np.where(np.any(self.masks[active], axis=1), 0, 1)).astype('int8')
+        self.dones[active] = dones
+        obs = self.blind_boards(self.players)
+        finished = active[dones > 0]
+        self.players[finished] *= -1  # victory player (or draw player) remains.
+
+        rew = {'capture-man': np.zeros((self.num_games,), dtype='bool'),
+            'capture-king': np.zeros((self.num_games,), dtype='bool'),
+            'win': np.zeros((self.num_games,), dtype='bool'),
+            'draw': np.zeros((self.num_games,), dtype='bool'),
+            'promotion': np.zeros((self.num_games,), dtype='bool')}
+        rew['capture-man'][active] = capture_man
+        rew['capture-king'][active] = capture_king
+        rew['win'][active] = dones == 1
+        rew['draw'][active] = dones == 2
+        rew['promotion'][active] = self.promotion[active]
+        info = {'move-count': self.move_counts.copy()}
+        return self.players.copy(), obs, self.masks.copy(), rew, self.dones.copy(), info
@@ -0,0 +1,145 @@
+""" Belief over the hidden squares, kept as a population of full boards.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+from .batch import BatchCheckers
+
+
+class BeliefState(object):
+    """
+    Particle filter over full boards, seen by one player.
+    Particles are the games of a BatchCheckers, so that they are moved and filtered as arrays :
+    own actions are applied to every particle, opponent turns are sampled uniformly among legal actions,
+    and particles which disagree with an observation on its visible squares are dropped before resampling.
+    Dropped particles are kept as finished games of the batch, so that they are never stepped.
+
+    Call reset at the start of the game, apply_action after each own action,
+    and update with the observation and info['prev-obs'] at the start of each own turn.
+    """
+
+    def __init__(self, rule, player, num_particles=BELIEF_PARTICLES, seed=None):
+        self.rule = rule
+        self.player = player
+        self.num_particles = num_particles
+        self.random_state = np.random.RandomState(seed)
+        self.batch = BatchCheckers(rule, num_particles)
+        self.alive = np.ones((num_particles,), dtype='bool')
+        self.num_consistent = num_particles  # consistent particles before the last resampling.
+        self.reset()
+
+    def reset(self, matrix=None, player=-1, move_count=0):
+        # The whole board is known at the start of the game.
+        self.batch.reset(players=player, matrices=matrix)
+        self.batch.move_counts[:] = move_count
+        self.alive[:] = True
+        self.num_consistent = self.num_particles
+
+    def apply_action(self, action):
+        """
+        Applies an own action (an integer of ActionSpace, or (from_pos, to_pos)) to every particle.
+        """
+
+        if not np.isscalar(action):
+            action = self.batch.action_space.encode(action)
+        self.alive &= self.batch.masks[:, action]
+        self.step(np.full((self.num_particles,), action, dtype='int'), self.alive)
+
+    def step(self, actions, moving):
+        # Steps only the moving particles. Particles whose game is over do not follow the real game.
+        batch = self.batch
+        batch.dones[:] = ~moving
+        batch.step(actions)
+        self.alive &= ~moving | (batch.dones == 0)
+        batch.dones[:] = ~self.alive
+
+    def random_actions(self, moving):
+        masks = self.batch.masks[moving]
+        counts = np.sum(masks, axis=1)
+        choices = (self.random_state.random_sample(len(counts)) * counts).astype('int')
+        actions = np.zeros((self.num_particles,), dtype='int')
+        actions[moving] = np.argmax(np.cumsum(masks, axis=1) > choices[:, None], axis=1)
+        return actions
+
+    def filter(self, obs):
+        # Particles must agree with every visible square of the observation.
+        obs = np.asarray(obs)
+        visible = obs != BLIND
+        self.alive &= np.all(self.batch.boards[:, visible] == obs[visible][None, :], axis=1)
+
+    def filter_moves(self, moves):
+        # Own legal moves (as moves or a legal mask) are known exactly.
+        mask = moves if isinstance(moves, np.ndarray) else self.batch.action_space.moves_to_mask(moves)
+        self.alive &= np.all(self.batch.masks == mask[None, :], axis=1)
+
+    def update(self, obs, prev_obs=(), moves=None):
+        """
+        Moves the particles through the opponent's turn and keeps those consistent with the observations.
+        prev_obs are the own observations before each hop of the opponent (info['prev-obs']).
+        If prev_obs is empty, opponent turns are sampled without intermediate observations.
+        Can be called before each own action, in the middle of a capture as well.
+        """
+
+        batch = self.batch
+        prior = (batch.boards.copy(), batch.move_counts.copy())
+        opponent = -self.player
+        if len(prev_obs) > 0:
+            for frame in prev_obs:
+                self.filter(frame)
+                moving = self.alive & (batch.players == opponent)
+                self.alive &= moving  # the turn of the opponent has ended too early.
+                self.step(self.random_actions(moving), moving)
+            self.alive &= batch.players == self.player  # the turn of the opponent goes on too long.
+        else:
+            for _ in range(batch.tables.num_squares):
+                moving = self.alive & (batch.players == opponent)
+                if not np.any(moving):
+                    break
+                self.step(self.random_actions(moving), moving)
+        self.filter(obs)
+        if moves is not None:
+            self.filter_moves(moves)
+        self.num_consistent = int(np.sum(self.alive))
+        if self.num_consistent == 0:
+            self.recover(obs, *prior)
+            if moves is not None:
+                self.filter_moves(moves)
+            if not np.any(self.alive):
+                self.alive[:] = True
+        self.resample()
+
+    def resample(self):
+        batch = self.batch
+        indices = self.random_state.choice(np.flatnonzero(self.alive), self.num_particles)
+        for array in (batch.boards, batch.players, batch.selected, batch.hops, batch.capture_man,
+                batch.capture_king, batch.promotion, batch.turn_counts, batch.move_counts, batch.masks):
+            array[:] = array[indices]
+        self.alive[:] = True
+        batch.dones[:] = 0
+
+    def recover(self, obs, boards, move_counts):
+        """
+        No particle explains the observations : the visible squares are copied into the previous particles,
+        keeping only their opponent pieces on the blind squares (own pieces are never blind).
+        """
+
+        obs = np.asarray(obs)
+        visible = obs != BLIND
+        boards = np.where(visible[None, :, :], obs[None, :, :], boards)
+        boards[(boards * self.player > 0) & ~visible[None, :, :]] = EMPTY
+        self.batch.reset(players=self.player, matrices=boards)
+        self.batch.move_counts[:] = move_counts
+
+    def sample(self, num_samples=1):
+        """
+        Returns num_samples full boards drawn from the particles, as an (num_samples, size, size) int8 array.
+        """
+
+        return self.batch.boards[self.random_state.randint(self.num_particles, size=num_samples)].copy()
@@ -0,0 +1,416 @@
+""" Bitboard implementation of the checkers board.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+from .tables import DIRECTIONS
+from .tables import PLAYER_DIRECTIONS
+from .tables import get_tables
+from .board import Board
+from .board import MoveRecord
+
+
+def iterate_bits(bits):
+    # Yields the index of each set bit in ascending order.
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class BitTables(object):
+    """
+    Precomputed masks for one rule, derived from RuleTables.
+    Square index is y*board_size+x, so only playable squares are ever set.
+    """
+
+    def __init__(self, rule):
+        rule_tables = get_tables(rule)
+        size = rule.board_size
+        self.size = size
+        self.num_squares = size * size
+        self.num_bytes = (self.num_squares + 7) // 8
+        # matrix values of men, kings and dead pieces of dark, then of light (see BitBoard.matrix).
+        self.piece_values = np.array([DARK, DARK_KING, DARK_DEAD, LIGHT, LIGHT_KING, LIGHT_DEAD], dtype='int')
+        self.square_pos = [(sq % size, sq // size) for sq in range(self.num_squares)]
+
+        self.playable = 0
+        for sq, (x, y) in enumerate(self.square_pos):
+            if (x + y) % 2 == 1:
+                self.playable |= 1 << sq
+        self.dark_promotion = sum(1 << ((size - 1) * size + x) for x in range(size))
+        self.light_promotion = sum(1 << x for x in range(size))
+
+        # rays[d][sq] : squares along direction d, until the edge of the board.
+        self.rays = []
+        self.step_sources = []  # squares from which one step in direction d stays on board.
+        self.step_shifts = []
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            rays = []
+            sources = 0
+            for sq, (x, y) in enumerate(self.square_pos):
+                ray = tuple(ny * size + nx for nx, ny in rule_tables.rays[d][y][x])
+                rays.append(ray)
+                if len(ray) > 0:
+                    sources |= 1 << sq
+            self.rays.append(rays)
+            self.step_sources.append(sources)
+            self.step_shifts.append(dy * size + dx)
+        self.man_rays = [[ray[:2] for ray in rays] for rays in self.rays]
+        self.king_rays = [[ray[:rule.king_range+1] for ray in rays] for rays in self.rays]
+
+        # King sight along rays : first king_range squares are always visible, the next one only when capturing.
+        self.king_sight_masks = [[sum(1 << s for s in ray[:rule.king_range]) for ray in rays] for rays in self.rays]
+        self.king_sight_tails = [[(1 << ray[rule.king_range]) if len(ray) > rule.king_range else 0 for ray in rays]
+            for rays in self.rays]
+
+        self.zobrist = dict((value, [keys[y][x] for x, y in self.square_pos])
+            for value, keys in rule_tables.zobrist.items())
+
+        self.man_boxes = [self.window_mask(rule_tables.man_windows[y][x]) for x, y in self.square_pos]
+        self.king_boxes = [self.window_mask(rule_tables.king_windows[y][x]) for x, y in self.square_pos]
+
+    def window_mask(self, window):
+        ystart, yend, xstart, xend = window
+        mask = 0
+        for by in range(ystart, yend):
+            for bx in range(xstart, xend):
+                mask |= 1 << (by * self.size + bx)
+        return mask
+
+    def step(self, bits, d):
+        # Moves every bit one square in direction d, dropping the ones leaving the board.
+        shift = self.step_shifts[d]
+        bits &= self.step_sources[d]
+        if shift > 0:
+            return bits << shift
+        else:
+            return bits >> -shift
+
+    def to_array(self, bits):
+        array = np.unpackbits(np.frombuffer(bits.to_bytes(self.num_bytes, 'little'), dtype=np.uint8),
+            bitorder='little')[:self.num_squares]
+        return array.astype('bool').reshape((self.size, self.size))
+
+    def from_array(self, array):
+        bits = 0
+        for sq in np.flatnonzero(array):
+            bits |= 1 << int(sq)
+        return bits
+
+
+class BitBoard(Board):
+    """
+    Board storing each piece kind of each colour as an integer bitmask.
+    It has the same interface as Board, and the matrix is only built when asked.
+    """
+
+    def __init__(self, rule, matrix=None):
+        self.rule = rule
+        self.tables = get_tables(rule, BitTables)
+        self.men = {1: 0, -1: 0}
+        self.kings = {1: 0, -1: 0}
+        self.dead = {1: 0, -1: 0}
+        if matrix is None:
+            self.init_board()
+        else:
+            self.matrix = matrix
+
+    def init_board(self):
+        size = self.rule.board_size
+        dark, light = 0, 0
+        for sq in iterate_bits(self.tables.playable):
+            y = sq // size
+            if y < (size - 1) // 2:
+                dark |= 1 << sq
+            elif y >= size - (size - 1) // 2:
+                light |= 1 << sq
+        self.men = {1: dark, -1: light}
+        self.kings = {1: 0, -1: 0}
+        self.dead = {1: 0, -1: 0}
+        self.hash = self.compute_hash()
+        return self.matrix
+
+    @property
+    def matrix(self):
+        tables = self.tables
+        masks = (self.men[1], self.kings[1], self.dead[1], self.men[-1], self.kings[-1], self.dead[-1])
+        buffer = b''.join([mask.to_bytes(tables.num_bytes, 'little') for mask in masks])
+        bits = np.unpackbits(np.frombuffer(buffer, dtype=np.uint8), bitorder='little').reshape((6, -1))
+        matrix = np.dot(tables.piece_values, bits[:, :tables.num_squares]).astype('int8')
+        return matrix.reshape((tables.size, tables.size))
+
+    @matrix.setter
+    def matrix(self, matrix):
+        for player in (1, -1):
+            self.men[player] = self.tables.from_array(matrix == player * DARK)
+            self.kings[player] = self.tables.from_array(matrix == player * DARK_KING)
+            self.dead[player] = self.tables.from_array(matrix == player * DARK_DEAD)
+        self.hash = self.compute_hash()
+
+    def compute_hash(self):
+        zobrist = self.tables.zobrist
+        key = 0
+        for player in (1, -1):
+            for value, bits in ((player * DARK, self.men[player]), (player * DARK_KING, self.kings[player]),
+                    (player * DARK_DEAD, self.dead[player])):
+                for sq in iterate_bits(bits):
+                    key ^= zobrist[value][sq]
+        return key
+
+    def set_matrix(self, matrix):
+        self.matrix = matrix
+
+    def get_state(self):
+        return (self.men[1], self.kings[1], self.dead[1], self.men[-1], self.kings[-1], self.dead[-1], self.hash)
+
+    def set_state(self, state):
+        self.men[1], self.kings[1], self.dead[1], self.men[-1], self.kings[-1], self.dead[-1], self.hash = state
+
+    def pos_to_square(self, pos):
+        return int(pos[1]) * self.rule.board_size + int(pos[0])
+
+    def occupied(self):
+        return self.men[1] | self.kings[1] | self.dead[1] | self.men[-1] | self.kings[-1] | self.dead[-1]
+
+    def blind_board(self, player, flip=False):
+        tables = self.tables
+        opponent = self.men[-player] | self.kings[-player]
+        visible = 0
+        for sq in iterate_bits(self.men[player]):
+            visible |= tables.man_boxes[sq]
+            if self.rule.sight == 1:  # additional process to capture
+                for imove, d in enumerate(PLAYER_DIRECTIONS[player]):
+                    if imove >= 2 and not self.rule.backward_capture:
+                        break
+                    ray = tables.man_rays[d][sq]
+                    if len(ray) == 2 and (opponent | self.dead[-player]) >> ray[0] & 1:
+                        visible |= 1 << ray[1]
+        if self.kings[player]:
+            blockers = self.occupied() & ~opponent
+            for sq in iterate_bits(self.kings[player]):
+                visible |= tables.king_boxes[sq]
+                for d in range(4):
+                    mask = tables.king_sight_masks[d][sq]
+                    visible |= mask
+                    if not blockers & mask:
+                        seen = opponent & mask
+                        if seen and not seen & (seen - 1):  # exactly one opponent to capture
+                            visible |= tables.king_sight_tails[d][sq]
+        blind = ~tables.to_array(visible)
+        matrix = self.matrix
+        if player == -1 and flip:
+            matrix = -matrix[::-1, ::-1]
+            blind = blind[::-1, ::-1]
+        matrix[blind] = BLIND
+        return matrix
+
+    def man_move_sources(self, player, empty, opponent):
+        # For each move index, men which can move quietly, and men which can capture, as bitmasks.
+        tables = self.tables
+        men = self.men[player]
+        quiet_sources, capture_sources = [], []
+        for imove, d in enumerate(PLAYER_DIRECTIONS[player]):
+            if imove >= 2 and not self.rule.backward_capture:
+                break
+            back = 3 - d
+            quiet_sources.append(men & tables.step(empty, back) if imove < 2 else 0)
+            capture_sources.append(men & tables.step(opponent & tables.step(empty, back), back))
+        return quiet_sources, capture_sources
+
+    def king_capture_available(self, player, empty, opponent):
+        for sq in iterate_bits(self.kings[player]):
+            for d in range(4):
+                if self.ray_moves(self.tables.king_rays[d][sq], self.rule.king_range, True, empty, opponent):
+                    return True
+        return False
+
+    def capture_available(self, player):
+        empty = self.tables.playable & ~self.occupied()
+        opponent = self.men[-player] | self.kings[-player]
+        _, capture_sources = self.man_move_sources(player, empty, opponent)
+        for sources in capture_sources:
+            if sources:
+                return True
+        return self.king_capture_available(player, empty, opponent)
+
+    def ray_moves(self, ray, attack_range, hop, empty, opponent):
+        legal_squares = []
+        capture_flag = False
+        for irange, sq in enumerate(ray):
+            if not capture_flag and irange == attack_range:  # cannot go
+                break
+            if empty >> sq & 1:
+                if not hop or capture_flag:
+                    legal_squares.append(sq)
+            elif opponent >> sq & 1 and not capture_flag:
+                capture_flag = True
+            else:  # same team, dead, or second opponent
+                break
+        return legal_squares
+
+    def square_legal_moves(self, player, sq, hop, empty, opponent):
+        tables = self.tables
+        square_pos = tables.square_pos
+        legal_moves = []
+        if self.men[player] >> sq & 1:
+            quiet_sources, capture_sources = self.man_move_sources(player, empty, opponent)
+            for imove, d in enumerate(PLAYER_DIRECTIONS[player][:len(capture_sources)]):
+                if not hop and quiet_sources[imove] >> sq & 1:
+                    legal_moves.append(square_pos[tables.rays[d][sq][0]])
+                elif capture_sources[imove] >> sq & 1:
+                    legal_moves.append(square_pos[tables.rays[d][sq][1]])
+        elif self.kings[player] >> sq & 1:
+            for d in PLAYER_DIRECTIONS[player]:
+                for to_sq in self.ray_moves(tables.king_rays[d][sq], self.rule.king_range, hop, empty, opponent):
+                    legal_moves.append(square_pos[to_sq])
+        return legal_moves
+
+    def get_legal_moves(self, pos, hop=False):
+        sq = self.pos_to_square(pos)
+        for player in (1, -1):
+            if (self.men[player] | self.kings[player]) >> sq & 1:
+                empty = self.tables.playable & ~self.occupied()
+                opponent = self.men[-player] | self.kings[-player]
+                return self.square_legal_moves(player, sq, hop, empty, opponent)
+        return []
+
+    def get_sight_moves(self, pos):
+        sq = self.pos_to_square(pos)
+        # We only call this function for king!
+        assert((self.kings[1] | self.kings[-1]) >> sq & 1)
+        player = 1 if self.kings[1] >> sq & 1 else -1
+        opponent = self.men[-player] | self.kings[-player]
+        blockers = self.occupied() & ~opponent
+        sight_moves = []
+        for d in PLAYER_DIRECTIONS[player]:
+            mask = self.tables.king_sight_masks[d][sq]
+            visible = mask
+            if not blockers & mask:
+                seen = opponent & mask
+                if seen and not seen & (seen - 1):
+                    visible |= self.tables.king_sight_tails[d][sq]
+            for to_sq in self.tables.king_rays[d][sq]:
+                if visible >> to_sq & 1:
+                    sight_moves.append(self.tables.square_pos[to_sq])
+        return sight_moves
+
+    def get_all_legal_moves(self, player, hop=False, selected_pos=None):
+        tables = self.tables
+        rays = tables.rays
+        square_pos = tables.square_pos
+        empty = tables.playable & ~self.occupied()
+        opponent = self.men[-player] | self.kings[-player]
+        quiet_sources, capture_sources = self.man_move_sources(player, empty, opponent)
+        captures = 0
+        for sources in capture_sources:
+            captures |= sources
+        if self.rule.force_capture and not hop:
+            hop = captures != 0 or self.king_capture_available(player, empty, opponent)
+
+        men = self.men[player]
+        movers = captures if hop else captures | quiet_sources[0] | quiet_sources[1]
+        pieces = (men & movers) | self.kings[player]
+        if selected_pos is not None:
+            pieces &= 1 << self.pos_to_square(selected_pos)
+        directions = PLAYER_DIRECTIONS[player]
+        moves = []
+        for sq in iterate_bits(pieces):
+            legal_moves = []
+            if men >> sq & 1:
+                for imove in range(len(capture_sources)):
+                    if not hop and quiet_sources[imove] >> sq & 1:
+                        legal_moves.append(square_pos[rays[directions[imove]][sq][0]])
+                    elif capture_sources[imove] >> sq & 1:
+                        legal_moves.append(square_pos[rays[directions[imove]][sq][1]])
+            else:
+                for d in directions:
+                    for to_sq in self.ray_moves(tables.king_rays[d][sq], self.rule.king_range, hop, empty, opponent):
+                        legal_moves.append(square_pos[to_sq])
+            if len(legal_moves) > 0:
+                moves.append((square_pos[sq], legal_moves))
+        return moves
+
+    def move_piece(self, from_pos, to_pos):
+        """
+        Move a piece from (from_x, from_y) to (to_x, to_y).
+        """
+
+        from_sq = self.pos_to_square(from_pos)
+        to_sq = self.pos_to_square(to_pos)
+        from_bit, to_bit = 1 << from_sq, 1 << to_sq
+        player = 1 if (self.men[1] | self.kings[1]) & from_bit else -1
+        zobrist = self.tables.zobrist
+        if self.men[player] & from_bit:
+            self.men[player] ^= from_bit | to_bit
+            self.hash ^= zobrist[player * DARK][from_sq] ^ zobrist[player * DARK][to_sq]
+        else:
+            assert(self.kings[player] & from_bit)
+            self.kings[player] ^= from_bit | to_bit
+            self.hash ^= zobrist[player * DARK_KING][from_sq] ^ zobrist[player * DARK_KING][to_sq]
+
+        distance = abs(int(to_pos[0]) - int(from_pos[0]))
+        assert(distance == abs(int(to_pos[1]) - int(from_pos[1])))
+        d = DIRECTIONS.index((int(to_pos[0] > from_pos[0]) * 2 - 1, int(to_pos[1] > from_pos[1]) * 2 - 1))
+        capture_man = False
+        capture_king = False
+        for sq in self.tables.rays[d][from_sq][:distance-1]:
+            bit = 1 << sq
+            for color in (1, -1):
+                if self.men[color] & bit:
+                    self.men[color] ^= bit
+                    self.dead[color] |= bit
+                    self.hash ^= zobrist[color * DARK][sq] ^ zobrist[color * DARK_DEAD][sq]
+                    capture_man = True
+                elif self.kings[color] & bit:
+                    self.kings[color] ^= bit
+                    self.dead[color] |= bit
+                    self.hash ^= zobrist[color * DARK_KING][sq] ^ zobrist[color * DARK_DEAD][sq]
+                    capture_king = True
+        hop = capture_man or capture_king
+        if capture_man:
+            capture_king = False
+        return hop, capture_man, capture_king
+
+    def make_move(self, from_pos, to_pos):
+        # Masks are integers, so the undo record simply keeps the masks (and the hash) before the move.
+        undo = self.get_state()
+        hop, capture_man, capture_king = self.move_piece(from_pos, to_pos)
+        end_turn = not hop or len(self.get_legal_moves(to_pos, hop)) == 0
+        promotion = False
+        if end_turn:
+            self.remove_dead_pieces()
+            promotion = self.promote(to_pos)
+        return MoveRecord(from_pos, to_pos, hop, capture_man, capture_king, end_turn, promotion, undo)
+
+    def unmake_move(self, record):
+        self.set_state(record.undo)
+
+    def remove_dead_pieces(self):
+        # Unlike Board, the matrix is not built here.
+        for player in (1, -1):
+            for sq in iterate_bits(self.dead[player]):
+                self.hash ^= self.tables.zobrist[player * DARK_DEAD][sq]
+        self.dead = {1: 0, -1: 0}
+
+    def promote(self, pos):
+        sq = self.pos_to_square(pos)
+        bit = 1 << sq
+        if self.men[1] & bit & self.tables.dark_promotion:
+            self.men[1] ^= bit
+            self.kings[1] |= bit
+            self.hash ^= self.tables.zobrist[DARK][sq] ^ self.tables.zobrist[DARK_KING][sq]
+            return True
+        elif self.men[-1] & bit & self.tables.light_promotion:
+            self.men[-1] ^= bit
+            self.kings[-1] |= bit
+            self.hash ^= self.tables.zobrist[LIGHT][sq] ^ self.tables.zobrist[LIGHT_KING][sq]
+            return True
+        return False
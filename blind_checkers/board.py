@@ -9,20 +9,41 @@ import sys
 import os
 import numpy as np
 
+from collections import namedtuple
+from operator import itemgetter
+
 from .constants import *
+from .tables import DIRECTIONS
+from .tables import get_tables
+
+
+# Undo record of Board.make_move. undo holds what each board needs to restore the squares.
+MoveRecord = namedtuple('MoveRecord', ['from_pos', 'to_pos', 'hop', 'capture_man', 'capture_king',
+    'end_turn', 'promotion', 'undo'])
+
+ROW_MAJOR = itemgetter(1, 0)  # sort key of positions, in the same order as np.where over the matrix.
 
 
 class Board(object):
+    """
+    The matrix is int8, and should be changed only through the methods below (or set_matrix),
+    since the piece lists, the visibility of each side and the Zobrist hash are updated incrementally.
+    """
+
     def __init__(self, rule, matrix=None):
         self.rule = rule
+        self.tables = get_tables(rule)
         if matrix is None:
             self.matrix = self.init_board()
         else:
-            self.matrix = matrix
+            self.matrix = np.asarray(matrix, dtype='int8')
+            self.reset_pieces()
+            self.reset_visibility()
+            self.hash = self.compute_hash()
 
     def init_board(self):
         # initialize squares and place them in matrix
-        matrix = EMPTY * np.ones((self.rule.board_size, self.rule.board_size), dtype='int')
+        matrix = EMPTY * np.ones((self.rule.board_size, self.rule.board_size), dtype='int8')
         for x in range(self.rule.board_size):
             for y in range(self.rule.board_size):
                 if ((x % 2 != 0) and (y % 2 == 0)) or ((x % 2 == 0) and (y % 2 != 0)):
@@ -31,8 +52,141 @@ class Board(object):
                     elif y >= self.rule.board_size - (self.rule.board_size - 1) // 2:
                         matrix[y, x] = LIGHT
         self.matrix = matrix
+        self.reset_pieces()
+        self.reset_visibility()
+        self.hash = self.compute_hash()
         return matrix
 
+    def set_matrix(self, matrix):
+        self.matrix[:, :] = matrix[:, :]
+        self.reset_pieces()
+        self.reset_visibility()
+        self.hash = self.compute_hash()
+
+    def get_state(self):
+        # Small copy of the position, which set_state restores (on this board or another board of the same rule).
+        return np.copy(self.matrix)
+
+    def set_state(self, state):
+        self.set_matrix(state)
+
+    def reset_pieces(self):
+        # Live pieces of each side as pos : whether it is a king, and positions of dead pieces.
+        self.pieces = {1: {}, -1: {}}
+        self.dead_poses = set()
+        ys, xs = np.where(self.matrix != EMPTY)
+        for x, y, value in zip(xs.tolist(), ys.tolist(), self.matrix[ys, xs].tolist()):
+            self.add_piece((x, y), value)
+
+    def add_piece(self, pos, value):
+        if abs(value) == DARK_DEAD:
+            self.dead_poses.add(pos)
+        elif value != EMPTY:
+            self.pieces[1 if value > 0 else -1][pos] = abs(value) == DARK_KING
+
+    def remove_piece(self, pos, value):
+        if abs(value) == DARK_DEAD:
+            self.dead_poses.discard(pos)
+        elif value != EMPTY:
+            del self.pieces[1 if value > 0 else -1][pos]
+
+    def get_piece_poses(self, player):
+        # Live pieces of the player, in the same order as np.where over the matrix.
+        return sorted(self.pieces[player], key=ROW_MAJOR)
+
+    def compute_hash(self):
+        zobrist = self.tables.zobrist
+        key = 0
+        ys, xs = np.where(self.matrix != EMPTY)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            key ^= zobrist[self.matrix[y, x]][y][x]
+        return key
+
+    def get_key(self, player, selected_pos=None):
+        """
+        Zobrist key of the position, including the player to move and the piece in the middle of capturing.
+        """
+
+        key = self.hash
+        if player == 1:
+            key ^= self.rule.tables.zobrist_player
+        if selected_pos is not None:
+            key ^= self.rule.tables.zobrist_selected[selected_pos[1]][selected_pos[0]]
+        return key
+
+    def reset_visibility(self):
+        # Visibility is rebuilt from scratch at the next blind_board call.
+        self.visible_counts = None  # for each side, how many pieces see each square.
+        self.sights = {}  # pos : (player, window, extra squares) of each piece counted in visible_counts.
+        self.changed_poses = set()
+
+    def piece_sight(self, pos):
+        x, y = pos
+        value = self.matrix[y, x]
+        player = int(np.sign(value))
+        if abs(value) == DARK:
+            window = self.tables.man_windows[y][x]
+            extras = []
+            if self.rule.sight == 1: # additional process to capture
+                for move_index in range(4 if self.rule.backward_capture else 2):
+                    direction = self.tables.directions[player][move_index]
+                    landing = self.tables.landings[direction][y][x]
+                    if landing is not None:
+                        next_x, next_y = self.tables.rays[direction][y][x][0]
+                        if player * self.matrix[next_y, next_x] < 0: # opponent at next square
+                            extras.append(landing)
+            return (player, window, extras)
+        elif abs(value) == DARK_KING:
+            window = self.tables.king_windows[y][x]
+            extras = self.get_sight_moves(pos) # For king, we use sight_moves function for easy implementation.
+            return (player, window, extras)
+        return None
+
+    def update_sight(self, pos):
+        if pos in self.sights:
+            player, (ystart, yend, xstart, xend), extras = self.sights.pop(pos)
+            counts = self.visible_counts[player]
+            counts[ystart:yend, xstart:xend] -= 1
+            for x, y in extras:
+                counts[y, x] -= 1
+        sight = self.piece_sight(pos)
+        if sight is not None:
+            player, (ystart, yend, xstart, xend), extras = sight
+            counts = self.visible_counts[player]
+            counts[ystart:yend, xstart:xend] += 1
+            for x, y in extras:
+                counts[y, x] += 1
+            self.sights[pos] = sight
+
+    def dependent_poses(self, pos):
+        # Pieces whose sight may change when pos is changed : pos itself,
+        # adjacent men (capture sight when sight is 1), and kings along the diagonals within king range.
+        x, y = pos
+        poses = [pos]
+        for direction in range(4):
+            for irange, (next_x, next_y) in enumerate(self.tables.rays[direction][y][x]):
+                if irange >= self.rule.king_range:
+                    break
+                value = abs(self.matrix[next_y, next_x])
+                if value == DARK_KING or (value == DARK and irange == 0 and self.rule.sight == 1):
+                    poses.append((next_x, next_y))
+        return poses
+
+    def update_visibility(self):
+        if self.visible_counts is None:
+            self.visible_counts = {
+                1: np.zeros((self.rule.board_size, self.rule.board_size), dtype='int'),
+                -1: np.zeros((self.rule.board_size, self.rule.board_size), dtype='int')}
+            self.sights = {}
+            poses = set(self.pieces[1]) | set(self.pieces[-1])  # dead pieces have no sight.
+        else:
+            poses = set()
+            for pos in self.changed_poses:
+                poses.update(self.dependent_poses(pos))
+        for pos in poses:
+            self.update_sight(pos)
+        self.changed_poses = set()
+
     def flip_pos(self, pos):
         x, y = pos
         return (self.rule.board_size-1-x, self.rule.board_size-1-y)
@@ -50,36 +204,8 @@ class Board(object):
         return flipped_moves
 
     def blind_board(self, player, flip=False): # player == 1 : DARK, player == -1 : LIGHT
-        blind = np.ones((self.rule.board_size, self.rule.board_size), dtype='bool')
-        ys, xs = np.where(player * self.matrix > 0)
-        for x, y in zip(xs, ys):
-            if abs(self.matrix[y, x]) == DARK:
-                ystart = max(y-self.rule.sight, 0)
-                yend = min(y+self.rule.sight+1, self.rule.board_size)
-                xstart = max(x-self.rule.sight, 0)
-                xend = min(x+self.rule.sight+1, self.rule.board_size)
-                blind[ystart:yend, xstart:xend] = False
-                if self.rule.sight == 1: # additional process to capture
-                    if 0 <= (y+2*player) < self.rule.board_size:
-                        if x-2 >= 0 and player * self.matrix[y+player, x-1] < 0: # opponent at (y+player, x-1)
-                            blind[y+2*player, x-2] = False
-                        if x+2 < self.rule.board_size and player * self.matrix[y+player, x+1] < 0: # opponent at (y+player, x+1)
-                            blind[y+2*player, x+2] = False
-                    if self.rule.backward_capture and (0 <= (y-2*player) < self.rule.board_size):
-                        if x-2 >= 0 and player * self.matrix[y-player, x-1] < 0: # opponent at (y-player, x-1)
-                            blind[y-2*player, x-2] = False
-                        if x+2 < self.rule.board_size and player * self.matrix[y-player, x+1] < 0: # opponent at (y-player, x+1)
-                            blind[y-2*player, x+2] = False
-
-            elif abs(self.matrix[y, x]) == DARK_KING:
-                ystart = max(y-self.rule.king_sight, 0)
-                yend = min(y+self.rule.king_sight+1, self.rule.board_size)
-                xstart = max(x-self.rule.king_sight, 0)
-                xend = min(x+self.rule.king_sight+1, self.rule.board_size)
-                blind[ystart:yend, xstart:xend] = False
-                sight_moves = self.get_sight_moves((x, y)) # For king, we use sight_moves function for easy implementation.
-                for pos in sight_moves:
-                    blind[pos[1], pos[0]] = False
+        self.update_visibility()
+        blind = self.visible_counts[player] == 0
         matrix = np.copy(self.matrix)
         if player == -1 and flip:
             matrix = -matrix[::-1, ::-1]
@@ -99,16 +225,17 @@ class Board(object):
             assert(move_index == 3)
             return (x-player, y-player)
 
+    def move_index_to_ray(self, player, pos, move_index, attack_range):
+        # Reachable squares from pos toward move_index, read from the precomputed tables.
+        x, y = pos
+        return self.tables.reach_rays[attack_range][self.tables.directions[player][move_index]][y][x]
+
     def move_index_to_capture_available(self, player, pos, move_index, attack_range):
-        move = pos
         capture_flag = False
-        for irange in range(attack_range+1):
+        for irange, move in enumerate(self.move_index_to_ray(player, pos, move_index, attack_range)):
             if not capture_flag and irange == attack_range: # cannot go
                 break
-            move = self.move_index_to_move(player, move, move_index)
             x, y = move
-            if not self.on_board(move):
-                break
             if self.matrix[y, x] == EMPTY:
                 if capture_flag:
                     return True
@@ -123,19 +250,13 @@ class Board(object):
         return False
 
     def capture_available(self, player):
-        ys, xs = np.where(np.bitwise_and(player * self.matrix > 0, np.fabs(self.matrix) != DARK_DEAD))
-        for x, y in zip(xs, ys):
-            pos = (x, y)
-            if abs(self.matrix[y, x]) == DARK:
-                attack_range = 1
-            else:
-                assert(abs(self.matrix[y, x]) == DARK_KING)
-                attack_range = self.rule.king_range
+        for pos, king in self.pieces[player].items():
+            attack_range = self.rule.king_range if king else 1
             if self.move_index_to_capture_available(player, pos, 0, attack_range):
                 return True
             if self.move_index_to_capture_available(player, pos, 1, attack_range):
                 return True
-            if (abs(self.matrix[y, x]) == DARK and self.rule.backward_capture) or abs(self.matrix[y, x]) == DARK_KING:
+            if king or self.rule.backward_capture:
                 if self.move_index_to_capture_available(player, pos, 2, attack_range):
                     return True
                 if self.move_index_to_capture_available(player, pos, 3, attack_range):
@@ -144,16 +265,12 @@ class Board(object):
 
     def move_index_to_sight_moves(self, player, pos, move_index, attack_range):
         sight_moves = []
-        move = pos
         capture_flag = False
         break_flag = False
-        for irange in range(attack_range+1):
+        for irange, move in enumerate(self.move_index_to_ray(player, pos, move_index, attack_range)):
             if (break_flag or not capture_flag) and irange == attack_range: # cannot go
                 break
-            move = self.move_index_to_move(player, move, move_index)
             x, y = move
-            if not self.on_board(move):
-                break
             sight_moves.append(move)
             if player * self.matrix[y, x] > 0 or abs(self.matrix[y, x]) == DARK_DEAD:  # same team or dead
                 break_flag = True
@@ -168,7 +285,7 @@ class Board(object):
         x, y = pos
         # We only call this function for king!
         assert(abs(self.matrix[y, x]) == DARK_KING)
-        player = np.sign(self.matrix[y, x])
+        player = 1 if self.matrix[y, x] > 0 else -1
         attack_range = self.rule.king_range
         sight_moves = []
         for move_index in range(4):
@@ -177,15 +294,11 @@ class Board(object):
 
     def move_index_to_legal_moves(self, player, pos, move_index, attack_range, hop):
         legal_moves = []
-        move = pos
         capture_flag = False
-        for irange in range(attack_range+1):
+        for irange, move in enumerate(self.move_index_to_ray(player, pos, move_index, attack_range)):
             if not capture_flag and irange == attack_range: # cannot go
                 break
-            move = self.move_index_to_move(player, move, move_index)
             x, y = move
-            if not self.on_board(move):
-                break
             if self.matrix[y, x] == EMPTY:
                 if not hop or capture_flag:
                     legal_moves.append(move)
@@ -208,7 +321,7 @@ class Board(object):
         x, y = pos
         if self.matrix[y, x] == EMPTY:
             return []
-        player = np.sign(self.matrix[y, x])
+        player = 1 if self.matrix[y, x] > 0 else -1
         if abs(self.matrix[y, x]) == DARK:
             attack_range = 1
         else:
@@ -228,14 +341,16 @@ class Board(object):
     def get_all_legal_moves(self, player, hop=False, selected_pos=None):
         if self.rule.force_capture and self.capture_available(player):
             hop = True
-        ys, xs = np.where(np.bitwise_and(player * self.matrix > 0, np.fabs(self.matrix) != DARK_DEAD))
+        if selected_pos is None:
+            poses = self.get_piece_poses(player)
+        else:
+            pos = (int(selected_pos[0]), int(selected_pos[1]))
+            poses = [pos] if pos in self.pieces[player] else []
         moves = []
-        for x, y in zip(xs, ys):
-            pos = (x, y)
-            if selected_pos is None or pos == selected_pos:
-                legal_moves = self.get_legal_moves(pos, hop)
-                if len(legal_moves) > 0:
-                    moves.append((pos, legal_moves))
+        for pos in poses:
+            legal_moves = self.get_legal_moves(pos, hop)
+            if len(legal_moves) > 0:
+                moves.append((pos, legal_moves))
         return moves
 
     def move_piece(self, from_pos, to_pos):
@@ -243,31 +358,82 @@ class Board(object):
         Move a piece from (from_x, from_y) to (to_x, to_y).
         """
 
-        from_x, from_y = from_pos
-        to_x, to_y = to_pos
-        self.matrix[to_y, to_x] = self.matrix[from_y, from_x]
+        from_x, from_y = int(from_pos[0]), int(from_pos[1])
+        to_x, to_y = int(to_pos[0]), int(to_pos[1])
         assert(abs(to_x - from_x) == abs(to_y - from_y))
-        range_x = np.arange(from_x, to_x, int(to_x > from_x) * 2 - 1)
-        range_y = np.arange(from_y, to_y, int(to_y > from_y) * 2 - 1)
-        self.matrix[from_y, from_x] = EMPTY
-        move_spaces = self.matrix[range_y, range_x]
+        piece = int(self.matrix[from_y, from_x])
+        self.set_square((from_x, from_y), EMPTY)
+        self.set_square((to_x, to_y), piece)
         capture_man = False
         capture_king = False
-        if np.all(move_spaces == EMPTY):
-            hop = False
-        else:
-            if np.any(np.fabs(move_spaces) == DARK):
-                capture_man = True
-            else:
-                assert(np.any(np.fabs(move_spaces) == DARK_KING))
-                capture_king = True
-            move_spaces = np.sign(move_spaces) * DARK_DEAD
-            self.matrix[range_y, range_x] = move_spaces
-            hop = True
+        distance = abs(to_x - from_x)
+        if distance > 1:
+            direction = DIRECTIONS.index((int(to_x > from_x) * 2 - 1, int(to_y > from_y) * 2 - 1))
+            for x, y in self.tables.rays[direction][from_y][from_x][:distance-1]:
+                value = int(self.matrix[y, x])
+                if value != EMPTY:
+                    if abs(value) == DARK:
+                        capture_man = True
+                    else:
+                        assert(abs(value) == DARK_KING)
+                        capture_king = True
+                    self.set_square((x, y), (1 if value > 0 else -1) * DARK_DEAD)
+        hop = capture_man or capture_king
+        if capture_man:
+            capture_king = False
         return hop, capture_man, capture_king
 
+    def set_square(self, pos, value):
+        x, y = int(pos[0]), int(pos[1])
+        old_value = int(self.matrix[y, x])
+        self.hash ^= self.tables.zobrist[old_value][y][x] ^ self.tables.zobrist[value][y][x]
+        self.remove_piece((x, y), old_value)
+        self.add_piece((x, y), value)
+        self.matrix[y, x] = value
+        self.changed_poses.add((x, y))
+
+    def make_move(self, from_pos, to_pos):
+        """
+        Move a piece, and finish the turn (remove dead pieces and promote) unless the piece can capture more.
+        Returns a MoveRecord, which unmake_move uses to restore the board.
+        """
+
+        from_x, from_y = from_pos
+        to_x, to_y = to_pos
+        piece = int(self.matrix[from_y, from_x])
+        key = self.hash
+        captured = None
+        distance = abs(to_x - from_x)
+        if distance > 1:
+            direction = DIRECTIONS.index((int(to_x > from_x) * 2 - 1, int(to_y > from_y) * 2 - 1))
+            for x, y in self.tables.rays[direction][from_y][from_x][:distance-1]:
+                if self.matrix[y, x] != EMPTY:
+                    captured = ((x, y), int(self.matrix[y, x]))
+        hop, capture_man, capture_king = self.move_piece(from_pos, to_pos)
+        end_turn = not hop or len(self.get_legal_moves(to_pos, hop)) == 0
+        dead = None
+        promotion = False
+        if end_turn:
+            dead = [((x, y), int(self.matrix[y, x])) for x, y in self.dead_poses]
+            self.remove_dead_pieces()
+            promotion = self.promote(to_pos)
+        return MoveRecord(from_pos, to_pos, hop, capture_man, capture_king, end_turn, promotion,
+            (piece, captured, dead, key))
+
+    def unmake_move(self, record):
+        piece, captured, dead, key = record.undo
+        if dead is not None:
+            for pos, value in dead:
+                self.set_square(pos, value)
+        if captured is not None:
+            self.set_square(captured[0], captured[1])
+        self.set_square(record.to_pos, EMPTY)
+        self.set_square(record.from_pos, piece)
+        self.hash = key
+
     def remove_dead_pieces(self):
-        self.matrix[np.fabs(self.matrix) == DARK_DEAD] = EMPTY
+        for pos in list(self.dead_poses):
+            self.set_square(pos, EMPTY)
         return self.matrix
 
     def on_board(self, pos):
@@ -277,10 +443,10 @@ class Board(object):
     def promote(self, pos):
         x, y = pos
         if self.matrix[y, x] == DARK and y == self.rule.board_size-1:
-            self.matrix[y, x] = DARK_KING
+            self.set_square(pos, DARK_KING)
             return True
         elif self.matrix[y, x] == LIGHT and y == 0:
-            self.matrix[y, x] = LIGHT_KING
+            self.set_square(pos, LIGHT_KING)
             return True
         return False
 
@@ -288,13 +454,4 @@ class Board(object):
         return (pos[1]*self.rule.board_size + pos[0]) // 2 + 1
 
     def board_number_to_pos(self, board_number):
-        full_board_number = (board_number - 1) * 2
-        x = full_board_number % self.rule.board_size
-        y = full_board_number // self.rule.board_size
-        if (x+y)%2 == 1:
-            return (x, y)
-        else:
-            full_board_number = (board_number - 1) * 2 + 1
-            x = full_board_number % self.rule.board_size
-            y = full_board_number // self.rule.board_size
-            return (x, y)
+        return get_tables(self.rule).board_number_poses[board_number]  # BitBoard has its own tables.
@@ -0,0 +1,80 @@
+""" Time controls of the arena.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+
+
+class TimeControl(object):
+    """
+    Chess clock of both players. Each player starts with base seconds for the game,
+    and gains increment seconds after each of its turns. Each action is also limited to move_time seconds.
+    base=None is the fixed time per action, without a game budget.
+    Wall and CPU times used by each player are recorded for the log.
+    """
+
+    def __init__(self, base=TIME_CONTROL_BASE, increment=TIME_CONTROL_INCREMENT, move_time=ACTION_TIMEOUT):
+        if base is None and move_time is None:
+            raise ValueError('Invalid time control: no base and no move time.')
+        self.base = base
+        self.increment = increment if base is not None else 0.
+        self.move_time = move_time
+        self.reset()
+
+    def reset(self):
+        self.remaining = {1: self.base, -1: self.base}
+        self.used = {1: 0., -1: 0.}
+        self.cpu = {1: 0., -1: 0.}
+
+    def get_limit(self, player):
+        # Time which the player can use for the next action.
+        if self.base is None:
+            return self.move_time
+        limit = self.remaining[player] if self.move_time is None else min(self.remaining[player], self.move_time)
+        return max(limit, 0.)
+
+    def get_info(self, player):
+        return {'time-left': self.remaining[player], 'time-limit': self.get_limit(player), 'increment': self.increment}
+
+    def charge(self, player, elapsed_time, cpu_time, end_turn):
+        self.used[player] += elapsed_time
+        self.cpu[player] += cpu_time
+        if self.base is not None:
+            self.remaining[player] -= elapsed_time
+            if end_turn:
+                self.remaining[player] += self.increment
+
+    def get_pdn_tags(self):
+        tags = [('TimeControl', str(self))]
+        if self.base is not None:
+            tags += [('WhiteClock', '%.3f' % self.remaining[-1]), ('BlackClock', '%.3f' % self.remaining[1])]
+        tags += [('WhiteTime', '%.3f' % self.used[-1]), ('BlackTime', '%.3f' % self.used[1]),
+            ('WhiteCPU', '%.3f' % self.cpu[-1]), ('BlackCPU', '%.3f' % self.cpu[1])]
+        return tags
+
+    def __str__(self):
+        if self.base is None:
+            return '%g/move' % self.move_time
+        return '%g+%g' % (self.base, self.increment)
+
+
+def allocate_time(info, time_budget, margin=SEARCH_TIME_MARGIN, moves_to_go=CLOCK_MOVES_TO_GO):
+    """
+    Search time for the next action : time_budget, within the clock in info if there is one.
+    The time left is spread over moves_to_go more actions, plus the increment, within the limit of the action
+    (minus margin, or a tenth of the limit for short limits).
+    """
+
+    if info.get('time-limit') is None:
+        return time_budget
+    budget = min(time_budget, info['time-limit'] - min(margin, info['time-limit'] / 10.))
+    if info.get('time-left') is not None:
+        budget = min(budget, info['time-left'] / moves_to_go + info.get('increment', 0.))
+    return max(budget, 0.)
@@ -55,17 +55,55 @@ PIECE_RATIO_DRAW = 0.95  # piece ratio relative to each board space, when not us
 FPS = 60  # maximum frames per second.
 
 # Game constants
+BOARD_TYPE = 'numpy'  # one of 'numpy' and 'bit'. 'bit' uses the bitboard engine, which is much faster.
 DRAW_MOVE_COUNT = 40 * 2  # with this moves without capturing, it becomes draw.
 MIN_VISUALIZE_TIME = 0.3  # minimum time to visualize each board.
 PRINT_TIME = 1.  # time duration to print the text (when game is started or ended.)
+PDN_LINE_LENGTH = 80  # maximum length of lines of moves in PDN.
+PDN_BUFFER_SIZE = 1 << 20  # bytes which PDN writers keep in memory before writing.
+
+# Search constants
+TRANSPOSITION_TABLE_SIZE = 16  # memory of transposition table for each agent, in MB.
+SEARCH_TIME_MARGIN = 0.5  # time which search agents keep out of ACTION_TIMEOUT, in seconds.
+BELIEF_PARTICLES = 1000  # candidate boards of a BeliefState.
+CLOCK_MOVES_TO_GO = 30  # actions over which search agents spread the time left on the clock.
+MAX_TREE_NODES = 500000  # nodes which tree search agents keep in memory, also between moves.
+
+# Parallel constants
+NUM_WORKERS = None  # number of rollout worker processes, None for every core.
+ROLLOUT_CHUNK_SIZE = 4  # simulations of one action in each rollout task.
+
+# Rating constants
+SPRT_ELO0 = 0.  # Elo difference of the null hypothesis of the sequential probability ratio test.
+SPRT_ELO1 = 30.  # Elo difference of the alternative hypothesis.
+SPRT_ALPHA = 0.05  # probability of accepting the alternative hypothesis when the null hypothesis is true.
+SPRT_BETA = 0.05  # probability of accepting the null hypothesis when the alternative hypothesis is true.
+ELO_CONFIDENCE = 0.95  # confidence of the interval of Elo difference.
+RATING_INITIAL = 1500.  # Elo rating of a new agent.
+RATING_K = 16.  # Elo points which each game moves, times the difference between result and expected score.
 
 # Main constants
-PLAY_MODE = 'match'  # one of 'match', 'league', and 'replay'.
+PLAY_MODE = 'match'  # one of 'match', 'test', 'league', 'self-play', and 'replay'.
 ACTION_TIMEOUT = 5.  # maximum amount of time to think
+TIME_CONTROL_BASE = None  # time of each player for the whole game, in seconds. None for ACTION_TIMEOUT per action only.
+TIME_CONTROL_INCREMENT = 0.  # time added to the clock after each turn, in seconds.
+PONDER = False  # whether agents search during the opponent's turn, in their own worker processes (as with ISOLATE_AGENTS).
+ISOLATE_AGENTS = False  # whether AI agents run in worker processes, which are stopped at the deadline.
+AGENT_DEADLINE_MARGIN = 0.1  # time which isolated agents keep out of ACTION_TIMEOUT, in seconds.
 REPEAT_EPISODES = True  # whether to repeat episodes.
 VISUALIZE = True  # visualize
 VISUALIZE_TYPE = 'light'  # one of 'dark', 'light', 'both', and 'no-blind'.
-AGENT_DARK = 'Greedy'  # one of 'Human', 'Random', 'Greedy'.
-AGENT_LIGHT = 'Human'  # one of 'Human', 'Random', 'Greedy'.
+AGENT_DARK = 'Greedy'  # one of 'Human', 'Random', 'Greedy', 'ISMCTS', 'AlphaBeta'.
+AGENT_LIGHT = 'Human'  # one of 'Human', 'Random', 'Greedy', 'ISMCTS', 'AlphaBeta'.
+MATCH_TEST = 'sprt'  # one of 'sprt' and 'elo', the test which ends 'test' mode.
+MATCH_MAX_GAMES = 1000  # maximum number of games in 'test' mode.
 LEAGUE_AGENTS = ['Greedy', 'Random', 'Greedy', 'Random']  # which agents to participate league.
+LEAGUE_ROUNDS = 1  # games of each pair of agents on each side.
+LEAGUE_WORKERS = None  # number of processes which play league games, None for every core.
+LEAGUE_RESUME = None  # log directory of an interrupted league to finish (e.g. '20190307052518'), None for a new league.
+SELF_PLAY_AGENTS = ['Greedy', 'Random']  # agents of 'self-play' mode. Games go through every pair of agents on both sides.
+SELF_PLAY_GAMES = 1000  # number of games in 'self-play' mode.
+SELF_PLAY_WORKERS = None  # number of processes which play self-play games, None for every core.
+ARCHIVE_SHARD_GAMES = 100  # games of each shard of a game archive, which are played by one process.
+ARCHIVE_FLUSH_GAMES = 16  # games which an archive writer keeps in memory before writing them.
 REPLAY_NAME = '20190307052518/round_00005_Random-Dark_vs_Greedy-Light.txt'  # name of file to replay.
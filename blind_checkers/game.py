@@ -13,10 +13,13 @@ import time
 
 from .constants import *
 from .board import Board
-from .graphics import Graphics
-
-import pygame
-import pygame.locals
+from .bitboard import BitBoard
+from .actions import get_action_space
+from .observation import LazyObservation
+from .pdn import read_pdn_games
+from .pdn import parse_move
+from .pdn import decode_fen
+from .pdn import format_pdn_game
 
 import datetime
 
@@ -26,11 +29,33 @@ class Checkers(object):
     The main game control.
     """
 
-    def __init__(self, rule, board=None, graphics=None, visualize=False, visualize_type='no-blind'):
+    def __init__(self, rule, board=None, graphics=None, visualize=False, visualize_type='no-blind', board_type='numpy',
+            action_type='pos', obs_type='array', collect_prev_obs=True):
         self.rule = rule
 
+        # action_type is one of 'pos', 'index'
+        # 'pos' : actions are (from_pos, to_pos), and moves are lists of (from_pos, legal_moves).
+        # 'index' : actions are integers of ActionSpace, and moves are boolean legal masks.
+        if action_type not in ('pos', 'index'):
+            raise ValueError('Invalid action type: %s.' % action_type)
+        self.action_type = action_type
+        self.action_space = get_action_space(rule)
+
+        # obs_type is one of 'array', 'lazy'
+        # 'lazy' : observations are LazyObservation, which builds the blind board only when it is used.
+        if obs_type not in ('array', 'lazy'):
+            raise ValueError('Invalid observation type: %s.' % obs_type)
+        self.obs_type = obs_type
+        self.collect_prev_obs = collect_prev_obs  # if False, info['prev-obs'] is always empty.
+
+        # board_type is one of 'numpy', 'bit'
         if board is None:
-            self.board = Board(rule)
+            if board_type == 'numpy':
+                self.board = Board(rule)
+            elif board_type == 'bit':
+                self.board = BitBoard(rule)
+            else:
+                raise ValueError('Invalid board type: %s.' % board_type)
         else:
             self.board = board
         self.draw_move_count = DRAW_MOVE_COUNT
@@ -39,6 +64,7 @@ class Checkers(object):
         self.graphics = None
         if self.visualize:
             if graphics is None:
+                from .graphics import Graphics  # pygame is only imported when visualizing.
                 self.graphics = Graphics(rule)
             else:
                 self.graphics = graphics
@@ -62,11 +88,14 @@ class Checkers(object):
         self.from_pos, self.to_pos = None, None
         self.visualize_time = time.time()
 
-        self.fen_string = ''
-        self.init_pdn_string = ''
-        self.pdn_string = ''
+        self.pdn_tags = []  # (name, value)
+        self.pdn_moves = []  # move of each turn, such as '32-28' or '19x28x37'.
+        self.pdn_result = '*'
+        self.pdn_player = self.player  # player of the first move.
 
         self.moves = None
+        self.legal_mask = None
+        self.undo_stack = []
 
     def reset(self, player=-1, matrix=None):
         self.player = player
@@ -84,31 +113,34 @@ class Checkers(object):
         self.from_pos, self.to_pos = None, None
         self.visualize_time = time.time()
 
-        self.fen_string = ''
-        self.init_pdn_string = ''
-        self.pdn_string = ''
+        self.pdn_tags = []  # (name, value)
+        self.pdn_moves = []  # move of each turn, such as '32-28' or '19x28x37'.
+        self.pdn_result = '*'
+        self.pdn_player = self.player  # player of the first move.
+        self.undo_stack = []
 
         if matrix is None:
             self.board.init_board()
         else:
-            self.board.matrix[:, :] = matrix[:, :]
+            self.board.set_matrix(matrix)
         self.render_once()
 
         self.moves = self.get_valid_moves()
+        self.legal_mask = None
 
         player = self.player
-        obs = self.board.blind_board(self.player)
-        moves = self.moves
-        info = {'prev-obs': [], 'move-count': self.move_count}
+        obs = self.get_obs(self.player)
+        moves = self.get_moves()
+        info = {'prev-obs': [], 'move-count': self.move_count, 'turn-count': self.turn_count}
         return player, obs, moves, info
 
-    def end_turn(self):
+    def end_turn(self, promotion):
         """
         End the turn. Switches the current player.
         end_turn() also checks for and game and resets a lot of class attributes.
+        Dead pieces are already removed and the piece is already promoted by Board.make_move.
         """
-        self.board.remove_dead_pieces()
-        self.promotion = self.board.promote(self.to_pos)
+        self.promotion = promotion
         self.player = -self.player
         if self.player == -1:
             self.turn_count += 1
@@ -120,9 +152,40 @@ class Checkers(object):
         self.selected_pos = None
         self.hop = False
 
+    def get_key(self):
+        return self.board.get_key(self.player, self.selected_pos)
+
     def get_valid_moves(self):
         return self.board.get_all_legal_moves(self.player, self.hop, self.selected_pos)
 
+    def get_obs(self, player):
+        if self.obs_type == 'lazy':
+            return LazyObservation(self.board, player)
+        return self.board.blind_board(player)
+
+    def get_legal_mask(self):
+        # Built once for each position, from the moves.
+        if self.legal_mask is None:
+            self.legal_mask = self.action_space.moves_to_mask(self.moves)
+        return self.legal_mask
+
+    def get_moves(self):
+        if self.action_type == 'index':
+            return self.get_legal_mask()
+        return self.moves
+
+    def is_valid_action(self, action):
+        if self.action_type == 'index':
+            index = int(action)
+            if not 0 <= index < self.action_space.num_actions:
+                return False
+            return bool(self.get_legal_mask()[index])
+        return self.is_valid_move(action)
+
+    def is_valid_move(self, move):
+        index = self.action_space.find(move)
+        return index is not None and bool(self.get_legal_mask()[index])
+
     def check_for_endgame(self, moves=None):
         """
         Checks to see if a player has run out of moves or pieces.
@@ -136,53 +199,154 @@ class Checkers(object):
                 return 0
         return 1
 
-    def step(self, action):
-        """obs, rew, done, info = env.step(action)"""
+    def get_reward(self):
+        return {'capture-man': self.capture_man,
+            'capture-king': self.capture_king,
+            'win': self.done == 1,
+            'draw': self.done == 2,
+            'promotion': self.promotion}
+
+    def apply_action(self, action):
+        """
+        Apply the action to the board and the game state, without building any observation.
+        Returns the undo record of the action. (The player is not switched yet when the game is over.)
+        """
+        record = (self.player, self.prev_player, self.done, self.selected_pos, self.hop, self.prev_hop,
+            self.capture_man, self.capture_king, self.promotion, self.turn_count, self.move_count,
+            self.moves, self.legal_mask, self.from_pos, self.to_pos)
         from_pos, to_pos = action
         self.from_pos, self.to_pos = from_pos, to_pos
-        from_x, from_y = from_pos
-        to_x, to_y = to_pos
         self.prev_player, self.prev_hop = self.player, self.hop
 
+        board_record = self.board.make_move(from_pos, to_pos)
+        self.hop, self.capture_man, self.capture_king = board_record.hop, board_record.capture_man, board_record.capture_king
+        if board_record.end_turn:
+            self.end_turn(board_record.promotion)
+        else:
+            self.selected_pos = to_pos
+
+        self.moves = self.get_valid_moves()
+        self.legal_mask = None
+        self.done = self.check_for_endgame(self.moves)
+        return (board_record,) + record
+
+    def push(self, action):
+        """
+        Fast step for search : no validation and no observation, and the action can be undone by pop().
+        Returns player, moves, rew, done as in step.
+        """
+        if self.action_type == 'index':
+            action = self.action_space.decode(int(action))
+        self.undo_stack.append(self.apply_action(action))
+        if self.done > 0:
+            self.player = -self.player  # victory player (or draw player) remains.
+        return self.player, self.get_moves(), self.get_reward(), self.done
+
+    def pop(self):
+        record = self.undo_stack.pop()
+        self.board.unmake_move(record[0])
+        (self.player, self.prev_player, self.done, self.selected_pos, self.hop, self.prev_hop,
+            self.capture_man, self.capture_king, self.promotion, self.turn_count, self.move_count,
+            self.moves, self.legal_mask, self.from_pos, self.to_pos) = record[1:]
+
+    def step(self, action):
+        """obs, rew, done, info = env.step(action)"""
         if self.moves is not None:
-            if not (from_pos in [pos for pos, _ in self.moves]):  # error
-                self.close()
-                raise ValueError('Invalid action.')
-            _, legal_moves = self.moves[[pos for pos, _ in self.moves].index(from_pos)]
-            if not to_pos in legal_moves:  # error
+            if not self.is_valid_action(action):  # error
                 self.close()
                 raise ValueError('Invalid action.')
+        if self.action_type == 'index':
+            action = self.action_space.decode(int(action))
 
         # update
-        last_matrix = self.board.blind_board(-self.player)
-        self.last_matrices.append(last_matrix)
+        if self.collect_prev_obs:
+            last_matrix = self.get_obs(-self.player)
+            self.last_matrices.append(last_matrix)
 
-        self.hop, self.capture_man, self.capture_king = self.board.move_piece(from_pos, to_pos)
-        if not self.hop or self.board.get_legal_moves(to_pos, self.hop) == []:
-            self.selected_pos = None
+        board_record = self.apply_action(action)[0]
+        if board_record.end_turn:
             prev_obs = self.last_matrices
             self.last_matrices = []
-            self.end_turn()
         else:
-            self.selected_pos = to_pos
             prev_obs = []
 
-        self.moves = self.get_valid_moves()
-        self.done = self.check_for_endgame(self.moves)
+        player = self.player
+        obs = self.get_obs(self.player)
+        moves = self.get_moves()
+        done = self.done
+        if done > 0:
+            self.player = -self.player  # victory player (or draw player) remains.
+            player = -player
+        rew = self.get_reward()
+        info = {'prev-obs': prev_obs, 'move-count': self.move_count, 'turn-count': self.turn_count}
+        return player, obs, moves, rew, done, info
+
+    def get_turn_paths(self):
+        """
+        Returns every possible turn of the current player, as paths of positions [from_pos, to_pos, ...].
+        A path is a single move, or a full multi-hop capture sequence.
+        """
+        paths = []
+        if self.done == 0:
+            self.collect_turn_paths([], paths)
+        return paths
+
+    def collect_turn_paths(self, path, paths):
+        for from_pos, legal_moves in self.moves:
+            for to_pos in legal_moves:
+                self.undo_stack.append(self.apply_action((from_pos, to_pos)))
+                next_path = path + [to_pos] if len(path) > 0 else [from_pos, to_pos]
+                if self.undo_stack[-1][0].end_turn or self.done > 0:
+                    paths.append(next_path)
+                else:
+                    self.collect_turn_paths(next_path, paths)
+                self.pop()
+
+    def step_turn(self, path):
+        """
+        player, obs, moves, rew, done, info = env.step_turn(path)
+        Plays a whole turn given as a path [from_pos, to_pos, ...] (see get_turn_paths).
+        Observation, moves and rewards are computed once for the turn, and captures of every hop are rewarded.
+        """
+        if len(path) < 2:
+            raise ValueError('Invalid path.')
+        num_hops = 0
+        capture_man, capture_king = False, False
+        last_matrices = list(self.last_matrices)
+        end_turn = False
+        for from_pos, to_pos in zip(path[:-1], path[1:]):
+            if end_turn or self.done > 0 or not self.is_valid_move((from_pos, to_pos)):
+                break
+            if self.collect_prev_obs:
+                self.last_matrices.append(self.get_obs(-self.player))
+            self.undo_stack.append(self.apply_action((from_pos, to_pos)))
+            num_hops += 1
+            end_turn = self.undo_stack[-1][0].end_turn
+            capture_man, capture_king = capture_man or self.capture_man, capture_king or self.capture_king
+        if num_hops < len(path) - 1 or not (end_turn or self.done > 0):  # error, the turn is undone.
+            for _ in range(num_hops):
+                self.pop()
+            self.last_matrices = last_matrices
+            self.close()
+            raise ValueError('Invalid path.')
+        del self.undo_stack[-num_hops:]
+
+        if end_turn:
+            prev_obs = self.last_matrices
+            self.last_matrices = []
+        else:
+            prev_obs = []
 
         player = self.player
-        obs = self.board.blind_board(self.player)
-        moves = self.moves
+        obs = self.get_obs(self.player)
+        moves = self.get_moves()
         done = self.done
         if done > 0:
             self.player = -self.player  # victory player (or draw player) remains.
             player = -player
-        rew = {'capture-man': self.capture_man,
-            'capture-king': self.capture_king,
-            'win': done == 1,
-            'draw': done == 2,
-            'promotion': self.promotion}
-        info = {'prev-obs': prev_obs, 'move-count': self.move_count}
+        rew = self.get_reward()
+        rew['capture-man'], rew['capture-king'] = capture_man, capture_king
+        info = {'prev-obs': prev_obs, 'move-count': self.move_count, 'turn-count': self.turn_count, 'num-hops': num_hops}
         return player, obs, moves, rew, done, info
 
     def render_once(self):
@@ -201,6 +365,8 @@ class Checkers(object):
                     self.graphics.update_display(self.board.matrix, None, [], None)
 
     def event_loop(self):
+        import pygame
+        import pygame.locals
         for event in pygame.event.get():
             if event.type == pygame.locals.QUIT:
                 self.graphics.close_window()
@@ -237,104 +403,52 @@ class Checkers(object):
     def step_pdn(self):
         from_board_number = self.board.pos_to_board_number(self.from_pos)
         to_board_number = self.board.pos_to_board_number(self.to_pos)
-        if self.prev_player == -1 and not self.prev_hop:  # new turn
-            self.pdn_string += '%d. ' % (self.turn_count + 1)
-        if not self.prev_hop:
+        if not self.prev_hop:  # new turn
             if self.capture_man or self.capture_king:
-                self.pdn_string += '%dx%d' % (from_board_number, to_board_number)
+                self.pdn_moves.append('%dx%d' % (from_board_number, to_board_number))
             else:
-                self.pdn_string += '%d-%d' % (from_board_number, to_board_number)
+                self.pdn_moves.append('%d-%d' % (from_board_number, to_board_number))
         else:
-            if self.capture_man or self.capture_king:
-                self.pdn_string += 'x%d' % to_board_number
-            else:
-                self.pdn_string += 'x%d' % to_board_number
-        if not self.hop:
-            self.pdn_string += ' '
+            self.pdn_moves[-1] += 'x%d' % to_board_number
         if self.done > 0:
             if self.done == 2:  # draw
-                self.pdn_string += '1/2-1/2'
-                self.init_pdn_string += '[Result "1/2-1/2"]\n'
+                self.pdn_result = '1/2-1/2'
             else:
                 assert(self.done == 1)  # victory
-                if self.prev_player == 1:
-                    self.pdn_string += '0-1'
-                    self.init_pdn_string += '[Result "0-1"]\n'
-                else:
-                    self.pdn_string += '1-0'
-                    self.init_pdn_string += '[Result "1-0"]\n'
-            self.init_pdn_string += '[GameType "20"]\n'
-            self.init_pdn_string += self.fen_string
-        return self.pdn_string
+                self.pdn_result = '0-1' if self.prev_player == 1 else '1-0'
+            self.pdn_tags += [('Result', self.pdn_result), ('GameType', '20')]
 
     def decode_fen(self, fen_string):
-        fen_string_refined = fen_string.split('"')[1]
-        fen_string_split = fen_string_refined.split(':')
-        if fen_string_split[0].strip() == 'B':
-            player = 1
-        else:
-            assert(fen_string_split[0].strip() == 'W')
-            player = -1
-        matrix = EMPTY * np.ones((self.rule.board_size, self.rule.board_size), dtype='int')
-        assert(fen_string_split[1][0] == 'W')
-        light_strings = fen_string_split[1][1:].split(',')
-        for light_string in light_strings:
-            light_string = light_string.strip()
-            if light_string[0] == 'K':
-                pos = self.board.board_number_to_pos(int(light_string[1:]))
-                matrix[pos[1], pos[0]] = LIGHT_KING
-            else:
-                pos = self.board.board_number_to_pos(int(light_string))
-                matrix[pos[1], pos[0]] = LIGHT
-        assert(fen_string_split[2][0] == 'B')
-        dark_strings = fen_string_split[2][1:].split(',')
-        for dark_string in dark_strings:
-            dark_string = dark_string.strip()
-            if dark_string[0] == 'K':
-                pos = self.board.board_number_to_pos(int(dark_string[1:]))
-                matrix[pos[1], pos[0]] = DARK_KING
-            else:
-                pos = self.board.board_number_to_pos(int(dark_string))
-                matrix[pos[1], pos[0]] = DARK
-        return player, matrix
+        return decode_fen(fen_string.split('"')[1], self.rule)
 
     def decode_pdn(self, pdn_string):
-        pdn_string_split = pdn_string.splitlines()
-        dark_name, light_name, round_number, player, matrix, actions = '', '', 1, -1, None, []
-        for pdn_string_sub in pdn_string_split[:-1]:  # last is main pdn string
-            if pdn_string_sub[:6] == '[White':  # light name
-                light_name = pdn_string_sub.split('"')[1]
-            elif pdn_string_sub[:6] == '[Black':  # dark name
-                dark_name = pdn_string_sub.split('"')[1]
-            elif pdn_string_sub[:6] == '[Round':  # round
-                round_number = int(pdn_string_sub.split('"')[1])
-            elif pdn_string_sub[:4] == '[FEN':  # fen
-                player, matrix = self.decode_fen(pdn_string_sub)
-        pdn_string = pdn_string_split[-1]
-        pdn_string_split = pdn_string.split()
-        for pdn_string_sub in pdn_string_split[:-1]:  # last is for result
-            poses = None
-            if '-' in pdn_string_sub:
-                poses = [self.board.board_number_to_pos(int(s)) for s in pdn_string_sub.split('-')]
-            elif 'x' in pdn_string_sub:
-                poses = [self.board.board_number_to_pos(int(s)) for s in pdn_string_sub.split('x')]
-            if poses is not None:
-                for from_pos, to_pos in zip(poses[:-1], poses[1:]):
-                    actions.append((from_pos, to_pos))
+        # Decodes the first game of pdn_string. Each hop of a capture must be given, as in get_pdn.
+        game = next(read_pdn_games(pdn_string.splitlines()))
+        tags = game['tags']
+        dark_name, light_name = tags.get('Black', ''), tags.get('White', '')
+        round_number = int(tags['Round']) if tags.get('Round', '').isdigit() else 1
+        player, matrix = decode_fen(tags['FEN'], self.rule) if 'FEN' in tags else (-1, None)
+        actions = []
+        for move in game['moves']:
+            poses = [self.board.board_number_to_pos(board_number) for board_number in parse_move(move)]
+            for from_pos, to_pos in zip(poses[:-1], poses[1:]):
+                actions.append((from_pos, to_pos))
         return dark_name, light_name, round_number, player, matrix, actions
 
     def reset_pdn(self, dark_name=None, light_name=None, round_number=1, acquire_fen=False):
-        self.init_pdn_string += '[Event ""]\n'
-        self.init_pdn_string += '[Site ""]\n'
-        self.init_pdn_string += '[Round "%d"]\n' % round_number
-        self.init_pdn_string += '[Date "%s"]\n' % f"{datetime.datetime.now():%Y.%m.%d}"
-        self.init_pdn_string += '[White "%s"]\n' % light_name
-        self.init_pdn_string += '[Black "%s"]\n' % dark_name
+        self.pdn_tags = [('Event', ''), ('Site', ''), ('Round', round_number),
+            ('Date', f"{datetime.datetime.now():%Y.%m.%d}"), ('White', light_name), ('Black', dark_name)]
+        self.pdn_moves = []
+        self.pdn_result = '*'
+        self.pdn_player = self.player
         if acquire_fen:
-            self.fen_string = self.get_fen()
+            self.pdn_tags.append(('FEN', self.get_fen().split('"')[1]))
+
+    def add_pdn_tag(self, name, value):
+        self.pdn_tags.append((name, value))
 
     def get_pdn(self):
-        return self.init_pdn_string + self.pdn_string
+        return format_pdn_game(self.pdn_tags, self.pdn_moves, self.pdn_result, self.pdn_player)
 
     def get_fen(self):
         assert(not self.hop)  # not in middle of capturing
@@ -344,23 +458,24 @@ class Checkers(object):
         else:
             fen_string += 'W:'
         fen_string += 'W'
-        ys, xs = np.where(self.board.matrix < 0)
+        matrix = self.board.matrix
+        ys, xs = np.where(matrix < 0)
         for x, y in zip(xs, ys):
             board_number = self.board.pos_to_board_number((x, y))
-            if self.board.matrix[y, x] == LIGHT:
+            if matrix[y, x] == LIGHT:
                 fen_string += '%d,' % board_number
             else:
-                assert(self.board.matrix[y, x] == LIGHT_KING)
+                assert(matrix[y, x] == LIGHT_KING)
                 fen_string += 'K%d,' % board_number
         fen_string = fen_string[:-1]
         fen_string += ':B'
-        ys, xs = np.where(self.board.matrix > 0)
+        ys, xs = np.where(matrix > 0)
         for x, y in zip(xs, ys):
             board_number = self.board.pos_to_board_number((x, y))
-            if self.board.matrix[y, x] == DARK:
+            if matrix[y, x] == DARK:
                 fen_string += '%d,' % board_number
             else:
-                assert(self.board.matrix[y, x] == DARK_KING)
+                assert(matrix[y, x] == DARK_KING)
                 fen_string += 'K%d,' % board_number
         fen_string = fen_string[:-1]
         fen_string += '"]\n'
@@ -0,0 +1,132 @@
+""" League of agents, played on a pool of processes.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import io
+import json
+import time
+import traceback
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+
+from .constants import *
+from .game import Checkers
+from .arena import make_agent
+from .arena import get_log_name
+from .arena import arena
+
+
+def play_league_game(task):
+    """
+    Plays one game of the league in a worker process, on a headless environment.
+    The game number is also the round number of its log, so that logs of all games have different names.
+    Returns player, done, log path and elapsed time.
+    """
+
+    game_number, dark_name, light_name, rule, board_type, log_dir, seed = task
+    start_time = time.time()
+    np.random.seed(seed)
+    env = Checkers(rule, board_type=board_type)
+    agent_dark = make_agent(dark_name, 1, rule)
+    agent_light = make_agent(light_name, -1, rule)
+    with contextlib.redirect_stdout(io.StringIO()):  # messages of the headless environment.
+        player, done = arena(env, agent_dark, agent_light, game_number, log_dir)
+    log_path = os.path.join(log_dir, get_log_name(agent_dark.name, agent_light.name, game_number, player, done))
+    agent_dark.close()
+    agent_light.close()
+    return player, done, log_path, time.time() - start_time
+
+
+def get_league_schedule(num_agents, num_rounds):
+    # Games of every pair of different agents on both sides, num_rounds times : (iround, iagent_dark, iagent_light).
+    return [(iround, iagent_dark, iagent_light) for iround in range(num_rounds)
+        for iagent_dark in range(num_agents) for iagent_light in range(num_agents) if iagent_dark != iagent_light]
+
+
+def save_checkpoint(checkpoint_path, state):
+    # The new state is written next to the checkpoint, then renamed, so that the checkpoint is always whole.
+    temp_path = '%s.%d.tmp' % (checkpoint_path, os.getpid())
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, checkpoint_path)
+
+
+def load_checkpoint(checkpoint_path, agent_names, num_rounds, rule):
+    """
+    State of the league in checkpoint_path, or a new state if there is no checkpoint.
+    The state has the league settings, the entropy of its seeds, and every finished game by game number.
+    """
+
+    settings = {'agents': list(agent_names), 'rounds': num_rounds, 'rule': repr(rule)}
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return dict(settings, entropy=None, games={})
+    with open(checkpoint_path, 'r') as f:
+        state = json.load(f)
+    for key, value in settings.items():
+        if state[key] != value:
+            raise ValueError('Invalid league checkpoint: %s is %s, not %s.' % (key, state[key], value))
+    return state
+
+
+def run_league(agent_names, rule, log_dir, num_rounds=LEAGUE_ROUNDS, num_workers=LEAGUE_WORKERS,
+        board_type=BOARD_TYPE, seed=None, checkpoint_path=None):
+    """
+    Plays the games of get_league_schedule on num_workers processes, and collects results as games finish.
+    Returns record_table of shape (num_rounds, num_agents, num_agents) :
+    the winner (1 or -1) of the game of dark agent i against light agent j, 2 for draw, 0 if it was not played.
+    A game which fails is reported and left as not played.
+
+    With checkpoint_path, the state of the league is saved after every game,
+    and a league restarted with the same checkpoint plays only the games which are not finished.
+    """
+
+    num_agents = len(agent_names)
+    record_table = np.zeros((num_rounds, num_agents, num_agents), dtype='int')
+    state = load_checkpoint(checkpoint_path, agent_names, num_rounds, rule)
+    if state['entropy'] is None:
+        state['entropy'] = np.random.SeedSequence(seed).entropy
+    seed_sequence = np.random.SeedSequence(state['entropy'])
+    num_workers = num_workers if num_workers is not None else os.cpu_count()
+    with ProcessPoolExecutor(num_workers) as executor:
+        games = {}
+        for igame, (iround, iagent_dark, iagent_light) in enumerate(get_league_schedule(num_agents, num_rounds)):
+            game = state['games'].get(str(igame + 1))
+            if game is not None:  # finished before the restart.
+                record_table[iround, iagent_dark, iagent_light] = game['result']
+                continue
+            game_seed = np.random.SeedSequence(seed_sequence.entropy,
+                spawn_key=seed_sequence.spawn_key + (igame,)).generate_state(1)[0]
+            task = (igame + 1, agent_names[iagent_dark], agent_names[iagent_light], rule, board_type, log_dir, game_seed)
+            games[executor.submit(play_league_game, task)] = (igame + 1, iround, iagent_dark, iagent_light)
+        for future in as_completed(games):
+            game_number, iround, iagent_dark, iagent_light = games[future]
+            try:
+                player, done, log_path, elapsed_time = future.result()
+            except Exception:
+                print(traceback.format_exc(), file=sys.stderr)
+                continue
+            result = 2 if done == 2 else int(player)  # 2 for draw
+            record_table[iround, iagent_dark, iagent_light] = result
+            if checkpoint_path is not None:
+                state['games'][str(game_number)] = {'round': iround, 'dark': iagent_dark, 'light': iagent_light,
+                    'result': result, 'log': log_path, 'time': elapsed_time}
+                save_checkpoint(checkpoint_path, state)
+    return record_table
+
+
+def compute_points(record_table):
+    # 3 points for a win, 1 point for a draw and 0 point for a loss, over all rounds.
+    record_table = record_table.reshape((-1,) + record_table.shape[-2:])
+    wins = np.sum(record_table == 1, axis=(0, 2)) + np.sum(record_table == -1, axis=(0, 1))
+    draws = np.sum(record_table == 2, axis=(0, 2)) + np.sum(record_table == 2, axis=(0, 1))
+    return 3 * wins + draws
@@ -0,0 +1,48 @@
+""" Matches of two agents, which end when a sequential test is resolved.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+from .arena import make_agent
+from .arena import arena
+from .rating import get_score
+from .rating import PairTest
+
+
+def run_match_test(env, agent_names, rule, log_dir, test=MATCH_TEST, max_games=MATCH_MAX_GAMES,
+        ratings=None, graphics=None):
+    """
+    Plays pairs of games of agent_names[0] (A) against agent_names[1] (B), A being dark in the first game
+    of each pair and light in the second, until the test of PairTest is resolved or max_games games are played.
+    Each game is rated in ratings, if given. Returns the PairTest.
+    """
+
+    agents = {(iagent, player): make_agent(agent_names[iagent], player, rule, graphics)
+        for iagent in range(2) for player in (1, -1)}
+    pair_test = PairTest()
+    round_number = 0
+    while round_number + 2 <= max_games:
+        scores = []
+        for iagent_dark in range(2):
+            round_number += 1
+            player, done = arena(env, agents[(iagent_dark, 1)], agents[(1 - iagent_dark, -1)], round_number, log_dir)
+            scores.append(get_score(player, done, 1 if iagent_dark == 0 else -1))
+            if ratings is not None:
+                ratings.update(agent_names[iagent_dark], agent_names[1 - iagent_dark], player, done)
+        pair_test.add_pair(*scores)
+        env.print(str(pair_test), font_size=40)
+        if pair_test.get_result(test) is not None:
+            break
+
+    for agent in agents.values():
+        agent.close()
+    if ratings is not None and ratings.path is not None:
+        ratings.save()
+    return pair_test
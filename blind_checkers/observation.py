@@ -0,0 +1,47 @@
+""" Observations built only when they are used.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+
+
+class LazyObservation(object):
+    """
+    Blind board of a player, computed on first access and cached.
+    It keeps a small copy of the position, so it is still correct after the board has moved on.
+    np.asarray(obs) (or obs.get()) gives the matrix.
+    """
+
+    def __init__(self, board, player, flip=False):
+        self.board = board
+        self.player = player
+        self.flip = flip
+        self.key = board.hash
+        self.state = board.get_state()
+        self.matrix = None
+
+    def get(self):
+        if self.matrix is None:
+            board = self.board
+            if board.hash != self.key:  # the board has moved on, so rebuild the position.
+                board = type(board)(board.rule)
+                board.set_state(self.state)
+            self.matrix = board.blind_board(self.player, self.flip)
+            self.board, self.state = None, None
+        return self.matrix
+
+    def __array__(self, dtype=None, copy=None):
+        matrix = self.get()
+        if dtype is not None:
+            return matrix.astype(dtype)
+        return matrix
+
+    def __getitem__(self, index):
+        return self.get()[index]
@@ -0,0 +1,118 @@
+""" Parallel rollouts on a persistent pool of worker processes.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+from .constants import *
+from .game import Checkers
+
+
+_WORKER = {}  # state of each worker process : scratch environment and shared position buffer.
+
+
+def init_worker(rule, board_type, buffer_name):
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    _WORKER['buffer'] = buffer  # kept, so that the memory stays mapped.
+    _WORKER['matrix'] = np.ndarray((rule.board_size, rule.board_size), dtype='int8', buffer=buffer.buf)
+    _WORKER['env'] = Checkers(rule, board_type=board_type, obs_type='lazy', collect_prev_obs=False)
+
+
+def weighted_reward(reward_weights, rew):
+    r = 0.
+    for name, weight in reward_weights:
+        r += float(rew[name]) * weight
+    return r
+
+
+def run_rollouts(task):
+    """
+    Plays num_simulation random rollouts after the action, from the position in the shared buffer.
+    Returns the sum of rewards, seen from the player.
+    """
+
+    player, move_count, action, num_simulation, future_count, reward_weights, seed = task
+    rng = np.random.default_rng(seed)
+    env = _WORKER['env']
+    env.reset(player, _WORKER['matrix'])
+    env.move_count = move_count
+    score = 0.
+    for _ in range(num_simulation):
+        next_action = action
+        for _ in range(future_count):
+            last_player = env.player
+            _, moves, rew, done = env.push(next_action)
+            r = weighted_reward(reward_weights, rew)
+            score += r if last_player == player else -r
+            if done > 0:
+                break
+            from_pos, legal_moves = moves[int(rng.random() * len(moves))]
+            next_action = (from_pos, legal_moves[int(rng.random() * len(legal_moves))])
+        while len(env.undo_stack) > 0:
+            env.pop()
+    return score
+
+
+class RolloutPool(object):
+    """
+    Worker processes are started once (for example once per match) and reused by every evaluate call.
+    The position is passed through a shared memory buffer, and only small task tuples are pickled.
+    Each task (ROLLOUT_CHUNK_SIZE simulations of one action) has its own random stream from SeedSequence,
+    and results are reduced in task order, so scores do not depend on the number of workers.
+    """
+
+    def __init__(self, rule, num_workers=NUM_WORKERS, board_type=BOARD_TYPE, chunk_size=ROLLOUT_CHUNK_SIZE, seed=None):
+        self.rule = rule
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.chunk_size = chunk_size
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.num_calls = 0
+        self.buffer = shared_memory.SharedMemory(create=True, size=rule.board_size * rule.board_size)
+        self.matrix = np.ndarray((rule.board_size, rule.board_size), dtype='int8', buffer=self.buffer.buf)
+        self.pool = multiprocessing.Pool(self.num_workers, initializer=init_worker,
+            initargs=(rule, board_type, self.buffer.name))
+
+    def evaluate(self, matrix, player, move_count, actions, num_simulation, future_count, reward_weights):
+        """
+        Returns the mean reward of num_simulation rollouts of future_count steps after each action.
+        matrix should not have BLIND squares.
+        """
+
+        self.matrix[:, :] = matrix
+        tasks = []
+        task_actions = []
+        for iaction, action in enumerate(actions):
+            for ichunk, start in enumerate(range(0, num_simulation, self.chunk_size)):
+                seed = np.random.SeedSequence(self.seed_sequence.entropy,
+                    spawn_key=self.seed_sequence.spawn_key + (self.num_calls, iaction, ichunk))
+                tasks.append((player, move_count, action, min(self.chunk_size, num_simulation - start),
+                    future_count, tuple(reward_weights), seed))
+                task_actions.append(iaction)
+        self.num_calls += 1
+        scores = np.zeros((len(actions),), dtype='float')
+        for iaction, score in zip(task_actions, self.pool.map(run_rollouts, tasks)):
+            scores[iaction] += score
+        return scores / num_simulation
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            del self.matrix
+            self.buffer.close()
+            self.buffer.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,197 @@
+""" Streaming reader and buffered writer of Portable Draughts Notation files with many games.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import re
+
+from .constants import *
+from .tables import get_tables
+
+
+PDN_RESULTS = {'1-0': (-1, 1), '2-0': (-1, 1), '0-1': (1, 1), '0-2': (1, 1),
+    '1/2-1/2': (0, 2), '1-1': (0, 2), '*': (0, 0)}  # result : (winner, done). White is light, and Black is dark.
+
+_TOKEN = re.compile(r'\[\s*\w+\s+"(?:[^"\\]|\\.)*"\s*\]|\[[^\]]*\]|[{}();]|[^\s{}()\[\];]+')
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+_MOVE = re.compile(r'^\d+(?:[-x]\d+)+$')
+
+
+def read_pdn_games(source):
+    """
+    Yields the games of a PDN file (a path, or any iterable of lines such as an open file) one by one,
+    keeping only the current game in memory. Each game is a dict of 'tags' (tag name : value),
+    'moves' (move strings such as '32-28' or '19x28x37') and 'result' (a key of PDN_RESULTS).
+    Comments, variations, move numbers, annotations and NAGs are skipped.
+    """
+
+    f = open(source, 'r') if isinstance(source, str) else source
+    try:
+        tags, moves = {}, []
+        comment, depth = False, 0
+        for line in f:
+            if line.startswith('%'):  # escaped line
+                continue
+            for token in _TOKEN.findall(line.lstrip('\ufeff')):
+                if comment:
+                    comment = token != '}'
+                    continue
+                if token == '{':
+                    comment = True
+                elif token == ';':  # the rest of the line is a comment.
+                    break
+                elif token == '(':
+                    depth += 1
+                elif token == ')':
+                    depth = max(depth - 1, 0)
+                elif depth > 0:  # variation
+                    continue
+                elif token[0] == '[':
+                    match = _TAG.match(token)
+                    if match is None:
+                        continue
+                    if len(moves) > 0 or match.group(1) in tags:  # a game without result token has ended.
+                        yield {'tags': tags, 'moves': moves, 'result': tags.get('Result', '*')}
+                        tags, moves = {}, []
+                    tags[match.group(1)] = match.group(2)
+                elif token in PDN_RESULTS:
+                    yield {'tags': tags, 'moves': moves, 'result': token}
+                    tags, moves = {}, []
+                else:
+                    token = _MOVE_NUMBER.sub('', token).rstrip('!?+*')
+                    if _MOVE.match(token):
+                        moves.append(token)
+        if len(tags) > 0 or len(moves) > 0:
+            yield {'tags': tags, 'moves': moves, 'result': tags.get('Result', '*')}
+    finally:
+        if f is not source:
+            f.close()
+
+
+def parse_move(move):
+    # Board numbers of a move string.
+    return [int(square) for square in re.split('[-x]', move)]
+
+
+def decode_fen(fen, rule):
+    """
+    Player to move and board matrix of a FEN setup such as 'W:W31-50:B1-20,K22' (K for kings, - for ranges).
+    """
+
+    board_number_poses = get_tables(rule).board_number_poses
+    fields = fen.strip().rstrip('.').split(':')
+    if fields[0].strip() not in ('W', 'B'):
+        raise ValueError('Invalid FEN: %s.' % fen)
+    player = 1 if fields[0].strip() == 'B' else -1
+    matrix = EMPTY * np.ones((rule.board_size, rule.board_size), dtype='int8')
+    for field in fields[1:]:
+        field = field.strip()
+        if len(field) == 0:
+            continue
+        if field[0] not in ('W', 'B'):
+            raise ValueError('Invalid FEN: %s.' % fen)
+        man, king = (LIGHT, LIGHT_KING) if field[0] == 'W' else (DARK, DARK_KING)
+        for square in field[1:].split(','):
+            square = square.strip()
+            if len(square) == 0:
+                continue
+            value = king if square[0] == 'K' else man
+            first, _, last = square.lstrip('K').partition('-')
+            for board_number in range(int(first), int(last or first) + 1):
+                if not 1 <= board_number < len(board_number_poses):
+                    raise ValueError('Invalid FEN: %s.' % fen)
+                x, y = board_number_poses[board_number]
+                matrix[y, x] = value
+    return player, matrix
+
+
+def format_pdn_game(tags, moves, result='*', player=-1, line_length=PDN_LINE_LENGTH):
+    """
+    PDN of one game : tags (tag name : value, or (name, value) pairs), then moves numbered by full turns
+    starting with the light player, and the result. player is the player of the first move.
+    """
+
+    tags = tags.items() if isinstance(tags, dict) else tags
+    lines = ['[%s "%s"]' % (name, value) for name, value in tags]
+    tokens = []
+    for imove, move in enumerate(moves):
+        iturn = imove + (1 if player == 1 else 0)
+        if iturn % 2 == 0:  # numbers stay on the line of their move.
+            tokens.append('%d. %s' % (iturn // 2 + 1, move))
+        else:
+            tokens.append('1... %s' % move if imove == 0 else move)
+    tokens.append(result)
+    line = ''
+    for token in tokens:
+        if len(line) > 0 and len(line) + 1 + len(token) > line_length:
+            lines.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if len(line) > 0 else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def decode_pdn_turns(env, game):
+    """
+    Replays a game of read_pdn_games on env (a Checkers), from its FEN setup or the initial board,
+    and returns its turns as paths of positions (see Checkers.get_turn_paths).
+    Captures may give only some squares of their path, such as the first and the last square.
+    Raises ValueError at the first illegal move. env is left at the end of the game.
+    """
+
+    board_number_poses = get_tables(env.rule).board_number_poses
+    player, matrix = decode_fen(game['tags']['FEN'], env.rule) if 'FEN' in game['tags'] else (-1, None)
+    env.reset(player, matrix)
+    paths = []
+    for move in game['moves']:
+        board_numbers = parse_move(move)
+        if max(board_numbers) >= len(board_number_poses) or min(board_numbers) < 1:
+            raise ValueError('Invalid move: %s.' % move)
+        poses = [board_number_poses[board_number] for board_number in board_numbers]
+        for path in env.get_turn_paths():
+            path_iter = iter(path)
+            if path[0] == poses[0] and path[-1] == poses[-1] and all(pos in path_iter for pos in poses):
+                break
+        else:
+            raise ValueError('Invalid move: %s.' % move)
+        env.step_turn(path)
+        paths.append(path)
+    return paths
+
+
+class PDNWriter(object):
+    """
+    Appends games to one PDN file through a buffer of buffer_size bytes, with a blank line after each game.
+    """
+
+    def __init__(self, path, mode='a', buffer_size=PDN_BUFFER_SIZE):
+        self.file = open(path, mode, buffering=buffer_size)
+        self.num_games = 0
+
+    def write(self, pdn_string):
+        # A game in PDN, such as Checkers.get_pdn.
+        self.file.write(pdn_string.rstrip('\n') + '\n\n')
+        self.num_games += 1
+
+    def write_game(self, tags, moves, result='*', player=-1):
+        self.write(format_pdn_game(tags, moves, result, player))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,161 @@
+""" Elo ratings and sequential tests of matches.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+import json
+from statistics import NormalDist
+
+from .constants import *
+
+
+def elo_to_score(elo):
+    # Expected score of a player which is elo points stronger.
+    return 1. / (1. + 10. ** (-elo / 400.))
+
+
+def score_to_elo(score):
+    score = min(max(score, 1e-6), 1. - 1e-6)
+    return -400. * np.log10(1. / score - 1.)
+
+
+def get_score(player, done, agent_player):
+    # Score of the agent of agent_player in a finished game : 1 for a win, 0.5 for a draw and 0 for a loss.
+    if done == 2:  # draw
+        return 0.5
+    return 1. if player == agent_player else 0.
+
+
+class PairTest(object):
+    """
+    Tests of the Elo difference between two agents A and B, from pairs of games with colours swapped.
+    Pairs are counted by the score of A over the pair (0, 0.5, 1, 1.5 or 2), which keeps the correlation
+    of both games of a pair (the same openings are good for the same colour).
+
+    The sequential probability ratio test compares elo0 against elo1 with the log-likelihood ratio
+    of the generalized SPRT, and ends at log(beta / (1 - alpha)) or log((1 - beta) / alpha).
+    The Elo bound ends when the confidence interval of the Elo difference excludes 0. The interval after k pairs
+    has error (1 - confidence) * 6 / (pi^2 k^2), so that checking it after every pair keeps the error of the test
+    below 1 - confidence.
+    A prior of one pair, spread over all results, keeps both from stopping at the first pairs.
+    """
+
+    def __init__(self, elo0=SPRT_ELO0, elo1=SPRT_ELO1, alpha=SPRT_ALPHA, beta=SPRT_BETA, confidence=ELO_CONFIDENCE):
+        assert(elo0 < elo1)
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.alpha = alpha
+        self.beta = beta
+        self.confidence = confidence
+        self.pair_counts = np.zeros((5,), dtype='int')  # pairs of each score of A, in half points.
+
+    @property
+    def num_games(self):
+        return 2 * int(np.sum(self.pair_counts))
+
+    def add_pair(self, score_first, score_second):
+        # Scores of A in both games of a pair.
+        self.pair_counts[int(round(2 * (score_first + score_second)))] += 1
+
+    def get_moments(self):
+        # Number of pairs, mean and variance of the score of A per game of a pair.
+        counts = self.pair_counts + 1. / len(self.pair_counts)
+        num_pairs = np.sum(counts)
+        scores = np.arange(len(counts)) / (len(counts) - 1.)
+        mean = np.sum(counts * scores) / num_pairs
+        variance = np.sum(counts * (scores - mean) ** 2) / num_pairs
+        return num_pairs, mean, variance
+
+    def get_llr(self):
+        num_pairs, mean, variance = self.get_moments()
+        score0, score1 = elo_to_score(self.elo0), elo_to_score(self.elo1)
+        return num_pairs * (score1 - score0) * (2. * mean - score0 - score1) / (2. * variance)
+
+    def get_llr_bounds(self):
+        return np.log(self.beta / (1. - self.alpha)), np.log((1. - self.beta) / self.alpha)
+
+    def get_elo(self):
+        # Elo difference of A over B, and its confidence interval.
+        num_pairs, mean, variance = self.get_moments()
+        error = (1. - self.confidence) * 6. / (np.pi ** 2 * max(np.sum(self.pair_counts), 1) ** 2)
+        radius = NormalDist().inv_cdf(1. - error / 2.) * np.sqrt(variance / num_pairs)
+        return score_to_elo(mean), score_to_elo(mean - radius), score_to_elo(mean + radius)
+
+    def get_result(self, test=MATCH_TEST):
+        """
+        1 if A is stronger (the alternative hypothesis for 'sprt'), -1 if not (the null hypothesis for 'sprt',
+        B is stronger for 'elo'), and None while the test goes on.
+        """
+
+        if test == 'sprt':
+            llr = self.get_llr()
+            lower, upper = self.get_llr_bounds()
+            return 1 if llr >= upper else -1 if llr <= lower else None
+        elif test == 'elo':
+            _, elo_lower, elo_upper = self.get_elo()
+            return 1 if elo_lower > 0. else -1 if elo_upper < 0. else None
+        else:
+            raise ValueError('Invalid test: %s.' % test)
+
+    def __str__(self):
+        elo, elo_lower, elo_upper = self.get_elo()
+        lower, upper = self.get_llr_bounds()
+        return 'Games {}, pairs {}\nElo {:.1f} [{:.1f}, {:.1f}]\nLLR {:.2f} [{:.2f}, {:.2f}]'.format(
+            self.num_games, self.pair_counts.tolist(), elo, elo_lower, elo_upper, self.get_llr(), lower, upper)
+
+
+class Ratings(object):
+    """
+    Elo ratings of agents by name, kept in a JSON file across matches and leagues.
+    After each game, the rating of each agent moves by k times its result minus its expected score.
+    """
+
+    def __init__(self, path=None, k=RATING_K, initial=RATING_INITIAL):
+        self.path = path
+        self.k = k
+        self.initial = initial
+        self.ratings = {}
+        self.num_games = {}
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                state = json.load(f)
+            self.ratings, self.num_games = state['ratings'], state['games']
+
+    def get(self, name):
+        return self.ratings.get(name, self.initial)
+
+    def update(self, dark_name, light_name, player, done):
+        dark_score = get_score(player, done, 1)
+        dark_change = self.k * (dark_score - elo_to_score(self.get(dark_name) - self.get(light_name)))
+        self.ratings[dark_name] = self.get(dark_name) + dark_change
+        self.ratings[light_name] = self.get(light_name) - dark_change
+        for name in (dark_name, light_name):
+            self.num_games[name] = self.num_games.get(name, 0) + 1
+
+    def update_league(self, agent_names, record_table):
+        # Games of a league (see run_league) in the order of the schedule. Games not played are skipped.
+        record_table = record_table.reshape((-1,) + record_table.shape[-2:])
+        for iround, iagent_dark, iagent_light in zip(*np.nonzero(record_table)):
+            result = record_table[iround, iagent_dark, iagent_light]
+            self.update(agent_names[iagent_dark], agent_names[iagent_light], 1 if result == 2 else result,
+                2 if result == 2 else 1)
+
+    def save(self):
+        # Written next to the file, then renamed, so that the file is always whole.
+        temp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump({'ratings': self.ratings, 'games': self.num_games}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def __str__(self):
+        names = sorted(self.ratings, key=lambda name: -self.ratings[name])
+        return '\n'.join('{} {:.1f} ({} games)'.format(name, self.ratings[name], self.num_games[name])
+            for name in names)
@@ -9,13 +9,58 @@ import sys
 import os
 import numpy as np
 
+from .tables import get_tables
+
+
+RULE_DEFAULTS = (
+    ('board_size', 10),
+    ('sight', 1),
+    ('king_sight', 2),
+    # ('range', 1),
+    ('king_range', 2),
+    ('force_capture', True),
+    ('backward_capture', True),
+    )
+
 
 class Rule(object):
+    """
+    Rules are immutable and hashable, so that tables precomputed for a rule can be shared by every board.
+    """
+
+    __slots__ = tuple(name for name, _ in RULE_DEFAULTS)
+
     def __init__(self, args):
-        self.board_size = args['board_size'] if 'board_size' in args else 10
-        self.sight = args['sight'] if 'sight' in args else 1
-        self.king_sight = args['king_sight'] if 'king_sight' in args else 2
-        # self.range = args['range'] if 'range' in args else 1
-        self.king_range = args['king_range'] if 'king_range' in args else 2
-        self.force_capture = args['force_capture'] if 'force_capture' in args else True
-        self.backward_capture = args['backward_capture'] if 'backward_capture' in args else True
+        for name, default in RULE_DEFAULTS:
+            object.__setattr__(self, name, args[name] if name in args else default)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Rule is immutable.')
+
+    def __delattr__(self, name):
+        raise AttributeError('Rule is immutable.')
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name, _ in RULE_DEFAULTS)
+
+    def key(self):
+        return tuple(getattr(self, name) for name, _ in RULE_DEFAULTS)
+
+    def __eq__(self, other):
+        return isinstance(other, Rule) and self.key() == other.key()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __reduce__(self):
+        return (Rule, (self.to_dict(),))
+
+    def __repr__(self):
+        return 'Rule(%r)' % self.to_dict()
+
+    @property
+    def tables(self):
+        return get_tables(self)
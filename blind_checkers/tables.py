@@ -0,0 +1,90 @@
+""" Precomputed tables for each rule.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+
+
+DIRECTIONS = ((1, 1), (-1, 1), (1, -1), (-1, -1))  # absolute diagonal directions (dx, dy).
+PLAYER_DIRECTIONS = {1: (0, 1, 2, 3), -1: (3, 2, 1, 0)}  # absolute direction of each move index.
+ZOBRIST_SEED = 20190307  # fixed, so that keys are the same in every process.
+
+
+class RuleTables(object):
+    """
+    Rays, capture landing squares and sight windows of every square, indexed as [direction][y][x].
+    Directions are absolute (see DIRECTIONS), PLAYER_DIRECTIONS maps move indices of Board to them.
+    """
+
+    def __init__(self, rule):
+        size = rule.board_size
+        self.size = size
+        self.directions = PLAYER_DIRECTIONS
+
+        # rays[d][y][x] : squares along direction d, until the edge of the board.
+        self.rays = []
+        for dx, dy in DIRECTIONS:
+            rays = []
+            for y in range(size):
+                rays_y = []
+                for x in range(size):
+                    ray = []
+                    nx, ny = x + dx, y + dy
+                    while 0 <= nx < size and 0 <= ny < size:
+                        ray.append((nx, ny))
+                        nx, ny = nx + dx, ny + dy
+                    rays_y.append(tuple(ray))
+                rays.append(rays_y)
+            self.rays.append(rays)
+
+        # Reachable squares for each attack range : attack_range squares, and one more only after capturing.
+        self.reach_rays = {}
+        for attack_range in (1, rule.king_range):
+            self.reach_rays[attack_range] = [[[ray[:attack_range+1] for ray in rays_y] for rays_y in rays]
+                for rays in self.rays]
+
+        # Capture landing square of men, None if it is out of board.
+        self.landings = [[[ray[1] if len(ray) > 1 else None for ray in rays_y] for rays_y in rays]
+            for rays in self.rays]
+
+        # Sight windows as (ystart, yend, xstart, xend).
+        self.man_windows = [[self.window(x, y, rule.sight) for x in range(size)] for y in range(size)]
+        self.king_windows = [[self.window(x, y, rule.king_sight) for x in range(size)] for y in range(size)]
+
+        self.board_number_poses = [None]
+        for y in range(size):
+            for x in range(size):
+                if (x + y) % 2 == 1:
+                    self.board_number_poses.append((x, y))
+
+        # Zobrist keys of each piece value on each square [value][y][x], of dark to move, and of the selected piece.
+        random_state = np.random.RandomState(ZOBRIST_SEED)
+        self.zobrist = {EMPTY: [[0] * size for _ in range(size)]}
+        for value in (DARK, LIGHT, DARK_KING, LIGHT_KING, DARK_DEAD, LIGHT_DEAD):
+            self.zobrist[value] = random_state.randint(1, 2**64-1, size=(size, size), dtype=np.uint64).tolist()
+        self.zobrist_player = int(random_state.randint(1, 2**64-1, dtype=np.uint64))
+        self.zobrist_selected = random_state.randint(1, 2**64-1, size=(size, size), dtype=np.uint64).tolist()
+
+    def window(self, x, y, sight):
+        return (max(y-sight, 0), min(y+sight+1, self.size), max(x-sight, 0), min(x+sight+1, self.size))
+
+
+_TABLES = {}
+
+
+def get_tables(rule, table_class=RuleTables):
+    """
+    Tables are built once for each rule (and each kind of table), and shared afterwards.
+    """
+
+    key = (table_class, rule)
+    if key not in _TABLES:
+        _TABLES[key] = table_class(rule)
+    return _TABLES[key]
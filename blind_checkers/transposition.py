@@ -0,0 +1,96 @@
+""" Transposition table shared by search agents.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import os
+import numpy as np
+
+from .constants import *
+
+
+EXACT = 0  # the value is exact.
+LOWER = 1  # the value is a lower bound (search failed high).
+UPPER = 2  # the value is an upper bound (search failed low).
+
+ENTRY_BYTES = 8 + 4 + 2 + 1 + 1 + 4  # key, value, depth, flag, age, move
+
+
+class TranspositionTable(object):
+    """
+    Fixed size table of search results, keyed by Zobrist keys (see Board.get_key).
+    Entries are kept in numpy arrays of buckets with two slots :
+    the first slot keeps the deepest result (depth-preferred), and the second is always replaced.
+    move is any integer chosen by the agent (-1 for no move).
+    """
+
+    def __init__(self, size_mb=TRANSPOSITION_TABLE_SIZE):
+        self.num_buckets = max(1, int(size_mb * 1024 * 1024) // (2 * ENTRY_BYTES))
+        self.keys = np.zeros((self.num_buckets, 2), dtype=np.uint64)
+        self.values = np.zeros((self.num_buckets, 2), dtype=np.float32)
+        self.depths = np.zeros((self.num_buckets, 2), dtype=np.int16)
+        self.flags = np.zeros((self.num_buckets, 2), dtype=np.int8)
+        self.ages = np.zeros((self.num_buckets, 2), dtype=np.uint8)
+        self.moves = np.zeros((self.num_buckets, 2), dtype=np.int32)
+        self.clear()
+
+    def clear(self):
+        self.depths[:, :] = -1  # empty slot
+        self.keys[:, :] = 0
+        self.moves[:, :] = -1
+        self.age = 0
+        self.num_probes = 0
+        self.num_hits = 0
+        self.num_stores = 0
+        self.num_replaces = 0
+
+    def new_search(self):
+        # Results of previous searches can be replaced by shallower results of the new search.
+        self.age = (self.age + 1) % 256
+
+    def probe(self, key):
+        """
+        Returns (value, depth, flag, move) stored for the key, or None.
+        """
+
+        self.num_probes += 1
+        bucket = key % self.num_buckets
+        for slot in (0, 1):
+            if self.depths[bucket, slot] >= 0 and int(self.keys[bucket, slot]) == key:
+                self.num_hits += 1
+                return (float(self.values[bucket, slot]), int(self.depths[bucket, slot]),
+                    int(self.flags[bucket, slot]), int(self.moves[bucket, slot]))
+        return None
+
+    def store(self, key, value, depth, flag, move=-1):
+        self.num_stores += 1
+        bucket = key % self.num_buckets
+        if (self.depths[bucket, 0] < 0 or int(self.keys[bucket, 0]) == key or
+                depth >= self.depths[bucket, 0] or self.ages[bucket, 0] != self.age):
+            slot = 0  # depth-preferred
+        else:
+            slot = 1  # always-replace
+        if self.depths[bucket, slot] >= 0 and int(self.keys[bucket, slot]) != key:
+            self.num_replaces += 1
+        self.keys[bucket, slot] = key
+        self.values[bucket, slot] = value
+        self.depths[bucket, slot] = depth
+        self.flags[bucket, slot] = flag
+        self.ages[bucket, slot] = self.age
+        self.moves[bucket, slot] = move
+
+    def hit_rate(self):
+        return self.num_hits / max(self.num_probes, 1)
+
+    def get_stats(self):
+        return {'probes': self.num_probes,
+            'hits': self.num_hits,
+            'hit-rate': self.hit_rate(),
+            'stores': self.num_stores,
+            'replaces': self.num_replaces,
+            'used': int(np.sum(self.depths >= 0)),
+            'capacity': self.num_buckets * 2,
+            'size-mb': self.num_buckets * 2 * ENTRY_BYTES / (1024 * 1024)}